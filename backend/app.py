@@ -1,91 +1,232 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request, stream_with_context
 from flask_cors import CORS
 from parser import OSMParser
-import time
+from settings import OSM_FILE, PREPROCESS, TRAFFIC_FILE
+from tiles import TiledParser
+from graph import ALGORITHMS
+from tour import solve as solve_tour
+from traffic import TrafficModel
+from batch import BatchRouter
+from loader import GraphLoader
+from payload import build_locations
+from search import SearchIndex
+from updates import GraphUpdater
+from spatial import simplify, convex_hull
+import polyline
+from metrics import REGISTRY, REQUEST_SECONDS
+from time import perf_counter, monotonic
+from functools import partial
+import json
+import snapshot
 import os
-import sys
-from datetime import datetime
+import signal
+import threading
 
 app = Flask(__name__)
-CORS(app)
-
-print("Starting Flask server...")
-osm_file_path = os.path.join(os.path.dirname(__file__), 'map_test.osm')
-if not os.path.exists(osm_file_path):
-    print(f"CRITICAL: {osm_file_path} not found")
-    G_PARSER = None
-else:
-    G_PARSER = OSMParser(osm_file_path)
+# 前端以 file:// 打开, 跨域读取 Retry-After 需显式暴露
+CORS(app, expose_headers=['Retry-After'])
 
 # --- 1. 时间与路况配置 ---
-# 上课时间表 (开始时间)
-CLASS_START_TIMES = ["08:00", "10:00", "13:00", "15:00", "18:00", "20:00"]
-# 拥堵定义: 上课前 20 分钟 (例如 7:40-8:00)
-CONGESTION_DURATION_MIN = 20 
+# 上课时间表、拥堵时段 (默认上课前 20 分钟) 及教学楼周边的分时段倍率见 traffic.json
+TRAFFIC = TrafficModel.load(TRAFFIC_FILE)
 
 # 速度配置 (m/s)
 SPEED_WALK = 1.2    # 约 4.3 km/h
 SPEED_BIKE = 3.1    
-CONGESTION_FACTOR = 1.25 # 拥堵时骑行时间增加倍率 (变为原来的1.25倍)
+
+# 漫游求解时间预算 (毫秒), 仅对超过精确求解规模的启发式搜索生效
+TOUR_TIME_BUDGET_MS = 200
+TOUR_TIME_BUDGET_MAX_MS = 2000
+
+# 距离矩阵: 单次请求的起点数 x 终点数上限
+MAX_MATRIX_CELLS = 10000
+
+# 批量路径: 单次请求的 OD 对上限与进程池大小
+MAX_BATCH_PAIRS = 20000
+# 每个 HTTP worker 各有一个进程池; serve.py 通过 NAV_HTTP_WORKERS 告知 worker 数, 默认按它均分 CPU 核数
+# (为 1 时不建进程池, 在请求线程中计算). 显式设置 NAV_BATCH_WORKERS 时, 总进程数约为 HTTP worker 数 x 该值
+HTTP_WORKERS = max(1, int(os.environ.get("NAV_HTTP_WORKERS", 1)))
+BATCH_WORKERS = int(os.environ.get("NAV_BATCH_WORKERS", max(1, (os.cpu_count() or 1) // HTTP_WORKERS)))
+
+# 分块路网目录 (tiles.py 的输出); 设置后按需加载瓦片, 不再读取 map_test.osm
+TILES_DIR = os.environ.get("NAV_TILES")
+# 已加载瓦片的内存上限 (MB); 只限制路网, 建筑表与轮廓另外全部常驻
+TILE_CACHE_MB = float(os.environ.get("NAV_TILE_CACHE_MB", 256))
+
+osm_file_path = OSM_FILE
+
+# 在线封路规则: 加载时应用, 此后每个进程至多每秒检查一次文件变化 (多进程部署时由其它 worker 写入)
+CLOSURES_PATH = os.environ.get("NAV_CLOSURES", os.path.join(os.path.dirname(__file__), 'closures.json'))
+CLOSURES_CHECK_INTERVAL = 1.0
+# 管理接口口令 (请求头 X-Admin-Token); 未设置时只接受本机请求
+ADMIN_TOKEN = os.environ.get("NAV_ADMIN_TOKEN")
+
+# 路网加载完成前, 除健康检查等接口外一律返回 503, Retry-After 为建议的重试间隔 (秒)
+LOAD_RETRY_AFTER = 2
+
+# 等时圈时间预算上限 (分钟)
+ISOCHRONE_MAX_MINUTES = 60
+
+# 地点检索分页上限
+SEARCH_PAGE_MAX = 50
 
 def analyze_traffic(time_str):
     """
     输入: HH:MM 字符串
-    输出: 骑行时间倍率 (1.0 = 正常, >1.0 = 拥堵)
+    输出: 骑行时间在全图的默认倍率 (1.0 = 正常, >1.0 = 拥堵); 教学楼周边的额外倍率已计入分时段边权
     """
-    try:
-        current = datetime.strptime(time_str, "%H:%M")
-        current_mins = current.hour * 60 + current.minute
-        
-        for start_str in CLASS_START_TIMES:
-            cls = datetime.strptime(start_str, "%H:%M")
-            cls_mins = cls.hour * 60 + cls.minute
-            
-            # 检查是否在 [上课前20分, 上课时间] 区间
-            if (cls_mins - CONGESTION_DURATION_MIN) <= current_mins < cls_mins:
-                return CONGESTION_FACTOR
-                
-        return 1.0 # 无拥堵
-    except:
-        return 1.0
+    return TRAFFIC.multiplier(TRAFFIC.slot_of(time_str), 2)
+
+def geometry_args():
+    """ 路线几何输出参数: format = json (默认, 坐标数组) / polyline (编码折线), tolerance = 简化容差 (米), precision = 编码精度 """
+    fmt = request.args.get('format', 'json')
+    tolerance = float(request.args.get('tolerance', 0))
+    precision = int(request.args.get('precision', 5))
+    if fmt not in ('json', 'polyline') or tolerance < 0 or not 1 <= precision <= 7: raise ValueError(fmt)
+    return fmt, tolerance, precision
+
+def format_path(path, geometry):
+    fmt, tolerance, precision = geometry
+    if tolerance > 0: path = simplify(path, tolerance)
+    return polyline.encode(path, precision) if fmt == 'polyline' else path
+
+class GraphState():
+    """ 一次加载得到的路网及其派生结构; 热替换时整体换掉, 每个请求开始时取一次引用并一直使用它 """
+    def __init__(self, parser, progress):
+        self.parser = parser
+        progress("locations")
+        self.locations = build_locations(parser)
+        progress("search_index")
+        self.search = SearchIndex.from_parser(parser)
+        progress("closures")
+        # 分块路网不支持在线封路
+        self.updater = GraphUpdater(parser, CLOSURES_PATH) if isinstance(parser, OSMParser) else None
+        self.batch = BatchRouter(parser, BATCH_WORKERS, parser_factory(), self.updater)
+        self.closures_checked = 0.0
+        self.sync_closures()
+
+    def changed(self, summary):
+        """ 路网更新后: 接入点变化时重建地点列表与检索索引; 进程池中的路网副本已过期, 下次使用时重新创建 """
+        if summary["buildings"]:
+            self.locations = build_locations(self.parser)
+            self.search = SearchIndex.from_parser(self.parser)
+        if summary["edges"]: self.batch.reset()
+
+    def sync_closures(self):
+        if self.updater is None or monotonic() - self.closures_checked < CLOSURES_CHECK_INTERVAL: return
+        self.closures_checked = monotonic()
+        try:
+            summary = self.updater.sync()
+        except (OSError, ValueError) as e:
+            print(f"Warning: failed to apply {CLOSURES_PATH}: {e}")
+            return
+        if summary: self.changed(summary)
+
+def parser_factory():
+    """ 按与 load_graph 相同的参数构造路网的可序列化工厂, 批量计算进程池的子进程用它映射同一份快照 """
+    if TILES_DIR: return partial(TiledParser, TILES_DIR, TILE_CACHE_MB, traffic=TRAFFIC)
+    return partial(OSMParser, osm_file_path, snapshot_path=snapshot.default_path(osm_file_path),
+                   traffic=TRAFFIC, **PREPROCESS)
+
+def load_graph(progress):
+    if TILES_DIR:
+        progress("manifest")
+        parser = parser_factory()()
+    else:
+        if not os.path.exists(osm_file_path): raise FileNotFoundError(f"{osm_file_path} not found")
+        # 优先映射预编译快照, 地图文件变化时自动重新解析
+        parser = parser_factory()(progress=progress)
+    return GraphState(parser, progress)
+
+def prepare_snapshot():
+    """ 生成或校验快照, 不保留路网; serve.py 在 fork 之前调用, 各 worker 加载时只需映射它 """
+    if TILES_DIR or not os.path.exists(osm_file_path): return
+    OSMParser(osm_file_path, snapshot_path=snapshot.default_path(osm_file_path), cache_size=0, **PREPROCESS)
+
+# 旧的一份被替换后关闭其进程池 (已提交的任务仍会完成)
+LOADER = GraphLoader(load_graph, retire=lambda state: state.batch.reset())
+
+print("Starting Flask server...")
+# serve.py 设置 NAV_DEFER_LOAD=1, 在 fork 之后 (或预加载时在 fork 之前) 自行启动加载;
+# 直接运行本文件时, 批量计算进程池的子进程会以 __mp_main__ 的名字重新导入它, 子进程不加载
+if os.environ.get("NAV_DEFER_LOAD") != "1" and __name__ != "__mp_main__": LOADER.start()
+# kill -HUP 触发后台重新加载并热替换 (如更新了地图文件或瓦片)
+if hasattr(signal, "SIGHUP") and threading.current_thread() is threading.main_thread():
+    signal.signal(signal.SIGHUP, lambda signum, frame: threading.Thread(target=LOADER.start, daemon=True).start())
 
 # --- API ---
 
+# 不依赖路网的接口, 加载期间照常响应
+UNGATED_ENDPOINTS = ('health', 'ready', 'metrics', 'admin_reload')
+
+def not_ready(body):
+    response = jsonify(body)
+    response.status_code = 503
+    response.headers['Retry-After'] = str(LOAD_RETRY_AFTER)
+    return response
+
+@app.before_request
+def start_timer():
+    if REGISTRY.enabled: g.request_start = perf_counter()
+    if request.endpoint in UNGATED_ENDPOINTS: return None
+    state = LOADER.current
+    if state is None:
+        if LOADER.error and not LOADER.loading: return jsonify({"error": "Init fail"}), 500
+        return not_ready({"error": "Graph loading", "stage": LOADER.status()["stage"]})
+    g.nav = state
+    state.sync_closures()
+
+@app.after_request
+def record_latency(response):
+    # 流式响应 (batch_routes) 只计到开始返回为止
+    start = g.get('request_start')
+    if start is not None:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_SECONDS.observe(perf_counter() - start, endpoint, request.method, str(response.status_code))
+    return response
+
 @app.route('/api/locations')
 def get_locations():
-    if not G_PARSER: return jsonify({"error": "Init fail"}), 500
-    locs = []
-    for b in G_PARSER.building_info_list:
-        name, wn, bn = b[0], b[1][1], b[2][1]
-        # 只要有步行或骑行接入点即可
-        node = wn if wn else bn
-        if node:
-            locs.append({
-                'name': name, 'lat': node.lat, 'lon': node.lon,
-                'polygon': G_PARSER.building_polygons.get(name, [])
-            })
-    return jsonify(sorted(locs, key=lambda x: x['name']))
+    """ 预先序列化的地点列表; 支持 ETag 条件请求与 gzip/br 压缩, detail = full/simplified/centroid """
+    detail = request.args.get('detail', 'full')
+    if detail not in g.nav.locations: return jsonify({"error": "Params error"}), 400
+    return g.nav.locations[detail].respond(request)
+
+@app.route('/api/search')
+def search_locations():
+    """ 地点检索: q = 名称/拼音/首字母片段, page 从 1 开始, size 为每页条数; 结果含接入点坐标 """
+    try:
+        q = request.args.get('q', '')
+        page = int(request.args.get('page', 1))
+        size = int(request.args.get('size', 10))
+        if page < 1 or not 1 <= size <= SEARCH_PAGE_MAX: raise ValueError(size)
+    except: return jsonify({"error": "Params error"}), 400
+    total, results = g.nav.search.search(q, page, size)
+    return jsonify({"query": q, "total": total, "page": page, "size": size, "results": results})
 
 @app.route('/api/find_path')
 def find_path():
     """ 标准导航: 同时计算步行和骑行，并根据时间推荐 """
-    if not G_PARSER: return jsonify({"error": "Init fail"}), 500
     try:
         slat, slon = float(request.args.get('start_lat')), float(request.args.get('start_lon'))
         elat, elon = float(request.args.get('end_lat')), float(request.args.get('end_lon'))
         dept_time = request.args.get('time', '08:00') # HH:MM
+        algorithm = request.args.get('algorithm', 'dijkstra') # dijkstra/astar/bidijkstra/biastar/alt
+        geometry = geometry_args()
     except: return jsonify({"error": "Params error"}), 400
+    if algorithm not in ALGORITHMS: return jsonify({"error": "Unknown algorithm"}), 400
 
-    # 1. 计算拥堵系数
-    bike_multiplier = analyze_traffic(dept_time)
+    # 1. 出发时间所在时段, 在该时段的加权路网上搜索
+    slot = TRAFFIC.slot_of(dept_time)
     
     # 2. 计算步行数据
-    w_path, w_dist = G_PARSER.Shortest_path_pos((slat, slon), (elat, elon), 1)
-    w_time = (w_dist / SPEED_WALK) if w_dist != -1 else -1
+    w_path, w_dist, w_cost = g.nav.parser.Timed_path_pos((slat, slon), (elat, elon), 1, slot, algorithm)
+    w_time = (w_cost / SPEED_WALK) if w_dist != -1 else -1
     
-    # 3. 计算骑行数据
-    b_path, b_dist = G_PARSER.Shortest_path_pos((slat, slon), (elat, elon), 2)
-    b_time = (b_dist / SPEED_BIKE * bike_multiplier) if b_dist != -1 else -1
+    # 3. 计算骑行数据; 拥堵倍率取该时段的路况倍率 (代价/距离 还会计入封路绕行的 reweight)
+    b_path, b_dist, b_cost = g.nav.parser.Timed_path_pos((slat, slon), (elat, elon), 2, slot, algorithm)
+    b_time = (b_cost / SPEED_BIKE) if b_dist != -1 else -1
+    bike_multiplier = TRAFFIC.multiplier(slot, 2)
 
     # 4. 推荐逻辑
     rec_mode = 'walk'
@@ -97,18 +238,18 @@ def find_path():
     return jsonify({
         "traffic_multiplier": bike_multiplier,
         "recommendation": rec_mode,
+        "format": geometry[0],
         "walk": {
-            "path": w_path, "dist": w_dist, "time": w_time
+            "path": format_path(w_path, geometry), "dist": w_dist, "time": w_time
         },
         "bike": {
-            "path": b_path, "dist": b_dist, "time": b_time
+            "path": format_path(b_path, geometry), "dist": b_dist, "time": b_time
         }
     })
 
 @app.route('/api/find_tour')
 def find_tour():
     """ 多点漫游: 返回路径及地点访问顺序 """
-    if not G_PARSER: return jsonify({"error": "Init fail"}), 500
     try:
         slat, slon = float(request.args.get('start_lat')), float(request.args.get('start_lon'))
         mode = request.args.get('mode') # walk/bike
@@ -116,6 +257,12 @@ def find_tour():
         # 接收 names 参数以便返回顺序
         names_str = request.args.get('names') # "Name1|Name2"
         dept_time = request.args.get('time', '08:00')
+        # 可选: 回到起点 / 固定最后一个途经点 (stops 中的下标, 从 0 开始) / 求解时间预算 (毫秒)
+        return_to_start = request.args.get('return', '0') in ('1', 'true')
+        end = request.args.get('end')
+        end = int(end) + 1 if end not in (None, '') else None
+        time_budget = min(float(request.args.get('time_budget', TOUR_TIME_BUDGET_MS)), TOUR_TIME_BUDGET_MAX_MS) / 1000
+        geometry = geometry_args()
     except: return jsonify({"error": "Params error"}), 400
 
     # 解析途经点
@@ -128,51 +275,209 @@ def find_tour():
         name = names[i] if i < len(names) else "未知地点"
         stops.append({'lat': lat, 'lon': lon, 'name': name})
 
+    if end is not None and (return_to_start or not 1 <= end <= len(stops)):
+        return jsonify({"error": "Params error"}), 400
+
     # 准备计算参数
     path_type = 1 if mode == 'walk' else 2
     speed = SPEED_WALK if mode == 'walk' else SPEED_BIKE
-    multiplier = 1.0
-    if mode == 'bike': multiplier = analyze_traffic(dept_time)
+    slot = TRAFFIC.slot_of(dept_time)
     
-    # 贪婪算法
+    # 基于该时段路网代价矩阵求访问顺序: 途经点少时精确求解, 否则在时间预算内做局部搜索
+    points = [(slat, slon)] + [(st['lat'], st['lon']) for st in stops]
+    dist = g.nav.parser.distance_matrix(points, points, path_type, slot)
+    order, _, method, elapsed = solve_tour(dist, return_to_start, end, time_budget)
+
+    legs = [stops[i - 1] for i in order]
+    if return_to_start: legs.append({'lat': slat, 'lon': slon, 'name': "起点"})
+
     curr_pos = (slat, slon)
-    unvisited = stops.copy()
-    
     full_path = []
     total_dist = 0
+    total_cost = 0
     visit_sequence = ["起点"] # 记录名称顺序
 
-    while unvisited:
-        # 找最近
-        nearest_idx = -1
-        min_d = sys.maxsize
-        for i, st in enumerate(unvisited):
-            d = G_PARSER.calculate_distance(curr_pos[0], curr_pos[1], st['lat'], st['lon'])
-            if d < min_d: min_d = d; nearest_idx = i
-        
-        target = unvisited.pop(nearest_idx)
+    for target in legs:
         visit_sequence.append(target['name'])
-        
-        # 寻路
-        seg_path, seg_dist = G_PARSER.Shortest_path_pos(curr_pos, (target['lat'], target['lon']), path_type)
-        
+        seg_path, seg_dist, seg_cost = g.nav.parser.Timed_path_pos(curr_pos, (target['lat'], target['lon']), path_type, slot)
+
         if seg_dist != -1:
             if full_path: full_path.extend(seg_path[1:])
             else: full_path.extend(seg_path)
             total_dist += seg_dist
-        
+            total_cost += seg_cost
+
         curr_pos = (target['lat'], target['lon'])
 
-    total_time = (total_dist / speed * multiplier) if total_dist > 0 else 0
+    total_time = (total_cost / speed) if total_dist > 0 else 0
+    multiplier = TRAFFIC.multiplier(slot, path_type)
 
     return jsonify({
-        "path": full_path,
+        "path": format_path(full_path, geometry),
+        "format": geometry[0],
         "dist": total_dist,
         "time": total_time,
         "sequence": visit_sequence,
-        "traffic_multiplier": multiplier
+        "traffic_multiplier": multiplier,
+        "solver": {"method": method, "elapsed_ms": elapsed * 1000}
     })
 
+@app.route('/api/isochrone')
+def isochrone():
+    """
+    等时圈: 出发时段内 minutes 分钟可到达的建筑 (按耗时排序), hull=1 时附带可达路网节点的凸包
+    一次有界单源搜索完成, 代价预算 = 分钟 x 60 x 速度; 时段拥堵倍率已计入该时段的边权
+    """
+    try:
+        slat, slon = float(request.args.get('lat')), float(request.args.get('lon'))
+        minutes = float(request.args.get('minutes', 10))
+        mode = request.args.get('mode', 'walk') # walk/bike
+        dept_time = request.args.get('time', '08:00')
+        with_hull = request.args.get('hull', '0') in ('1', 'true')
+        if mode not in ('walk', 'bike') or not 0 <= minutes <= ISOCHRONE_MAX_MINUTES: raise ValueError(mode)
+    except: return jsonify({"error": "Params error"}), 400
+
+    path_type = 1 if mode == 'walk' else 2
+    speed = SPEED_WALK if mode == 'walk' else SPEED_BIKE
+    slot = TRAFFIC.slot_of(dept_time)
+    result = g.nav.parser.isochrone((slat, slon), path_type, minutes * 60 * speed, slot)
+    if result is None: return jsonify({"error": "Out of bounds"}), 400
+    reached, coords = result
+
+    buildings = sorted(({"name": name, "lat": nd.lat, "lon": nd.lon, "time": cost / speed}
+                        for name, nd, cost in reached), key=lambda b: (b["time"], b["name"]))
+    out = {
+        "mode": mode,
+        "minutes": minutes,
+        "traffic_multiplier": TRAFFIC.multiplier(slot, path_type),
+        "buildings": buildings,
+    }
+    if with_hull: out["hull"] = convex_hull(coords)
+    return jsonify(out)
+
+@app.route('/api/distance_matrix')
+def distance_matrix():
+    """
+    多对多路网距离矩阵: 同时返回步行与骑行的距离和时间
+    time 为出发时段内最快路线的耗时, dist 为同一条路线的实际长度 (不含拥堵与 reweight 倍率), 与 /api/find_path 一致
+    """
+    try:
+        # "lat,lon|lat,lon", targets 缺省时与 sources 相同
+        sources = [tuple(map(float, p.split(','))) for p in request.args.get('sources').split('|')]
+        targets_str = request.args.get('targets')
+        targets = [tuple(map(float, p.split(','))) for p in targets_str.split('|')] if targets_str else sources
+        dept_time = request.args.get('time', '08:00')
+    except: return jsonify({"error": "Params error"}), 400
+    if len(sources) * len(targets) > MAX_MATRIX_CELLS: return jsonify({"error": "Too many cells"}), 413
+
+    slot = TRAFFIC.slot_of(dept_time)
+    bike_multiplier = analyze_traffic(dept_time)
+    w_dist, w_cost = g.nav.parser.distance_matrix(sources, targets, 1, slot, with_lengths=True)
+    b_dist, b_cost = g.nav.parser.distance_matrix(sources, targets, 2, slot, with_lengths=True)
+    w_time = [[d / SPEED_WALK if d != -1 else -1 for d in row] for row in w_cost]
+    b_time = [[d / SPEED_BIKE if d != -1 else -1 for d in row] for row in b_cost]
+
+    return jsonify({
+        "traffic_multiplier": bike_multiplier,
+        "walk": {"dist": w_dist, "time": w_time},
+        "bike": {"dist": b_dist, "time": b_time}
+    })
+
+@app.route('/api/batch_routes', methods=['POST'])
+def batch_routes():
+    """
+    批量路径: body 为 {"pairs": [{"start_lat", "start_lon", "end_lat", "end_lon", "mode", "time", "id"}], "paths": false}
+    同一起点的 OD 对共用一次搜索, 在进程池中并行计算; 结果按完成顺序以 NDJSON 逐行返回
+    """
+    try:
+        body = request.get_json(force=True)
+        with_paths = bool(body.get('paths', False))
+        pairs, meta = [], []
+        for i, p in enumerate(body['pairs']):
+            mode = p.get('mode', 'walk')
+            if mode not in ('walk', 'bike'): raise ValueError(mode)
+            start = (float(p['start_lat']), float(p['start_lon']))
+            end = (float(p['end_lat']), float(p['end_lon']))
+            type = 1 if mode == 'walk' else 2
+            pairs.append((i, start, end, type, TRAFFIC.slot_of(p.get('time', '08:00'))))
+            meta.append((p.get('id'), mode))
+    except: return jsonify({"error": "Params error"}), 400
+    if len(pairs) > MAX_BATCH_PAIRS: return jsonify({"error": "Too many pairs"}), 413
+
+    def generate():
+        for index, path, dist, cost in g.nav.batch.run(pairs, with_paths):
+            pid, mode = meta[index]
+            speed = SPEED_WALK if mode == 'walk' else SPEED_BIKE
+            line = {"index": index, "id": pid, "mode": mode,
+                    "dist": dist, "time": cost / speed if dist != -1 else -1}
+            if with_paths: line["path"] = path or []
+            yield json.dumps(line, ensure_ascii=False) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/health')
+def health():
+    """ 存活检查: 进程能响应即为 200; 附带加载状态与各阶段耗时 """
+    return jsonify(dict(LOADER.status(), status="ok"))
+
+@app.route('/api/ready')
+def ready():
+    """ 就绪检查: 已有可用路网时为 200 (重新加载期间旧路网仍在服务), 否则 503 """
+    status = LOADER.status()
+    return jsonify(status) if status["ready"] else not_ready(status)
+
+@app.route('/api/metrics')
+def metrics():
+    """ Prometheus 文本格式的指标; NAV_METRICS=0 时关闭 """
+    if not REGISTRY.enabled: return jsonify({"error": "Metrics disabled"}), 404
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+def admin_allowed():
+    if ADMIN_TOKEN: return request.headers.get('X-Admin-Token') == ADMIN_TOKEN
+    return request.remote_addr in ('127.0.0.1', '::1')
+
+@app.route('/api/admin/closures', methods=['GET', 'POST', 'PUT'])
+def closures():
+    """
+    封路管理 (格式见 updates.py):
+        GET  当前规则
+        POST {"rules": [...], "reopen": [规则 id]}  按 id 新增/替换规则, 并重新开放 reopen 中的规则
+        PUT  {"rules": [...]}                       整体替换
+    返回本次更新的统计 (变化边数、重算接入点的建筑、失效缓存数、重算的距离表行数、耗时)
+    """
+    if not g.nav.updater: return jsonify({"error": "Not supported for tiled maps"}), 501
+    if not admin_allowed(): return jsonify({"error": "Forbidden"}), 403
+    if request.method == 'GET': return jsonify({"rules": list(g.nav.updater.rules.values())})
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict): return jsonify({"error": "Params error"}), 400
+    try:
+        if request.method == 'PUT':
+            summary = g.nav.updater.set_rules(body.get('rules', []))
+            g.nav.updater.save()
+        else:
+            summary = g.nav.updater.update(body.get('rules', []), body.get('reopen', []))
+    except (ValueError, TypeError) as e: return jsonify({"error": str(e)}), 400
+    g.nav.changed(summary)
+    return jsonify(summary)
+
+@app.route('/api/admin/reload', methods=['POST'])
+def admin_reload():
+    """ 后台重新加载路网, 完成后原子替换; 已在加载中时不重复启动. 加载进度见 /api/health """
+    if not admin_allowed(): return jsonify({"error": "Forbidden"}), 403
+    started = LOADER.start()
+    return jsonify(dict(LOADER.status(), started=started)), 202
+
+@app.route('/api/route_cache')
+def route_cache_stats():
+    """ 最短路缓存命中/未命中/淘汰计数 """
+    return jsonify(g.nav.parser.route_cache.stats())
+
+@app.route('/api/tiles')
+def tile_stats():
+    """ 分块路网的瓦片缓存: 瓦片总数、已加载数、估算内存与上限、命中/加载/淘汰计数 """
+    if not isinstance(g.nav.parser, TiledParser): return jsonify({"error": "Not a tiled map"}), 404
+    return jsonify(g.nav.parser.store.stats())
+
 if __name__ == '__main__':
     # 关键修改：禁用 reloader 避免进程重启，提高启动脚本的稳定性
     app.run(debug=True, port=5000, use_reloader=False)
\ No newline at end of file
@@ -0,0 +1,86 @@
+"""
+批量路径计算
+OD 对按 (出行方式, 时段, 起点) 分组, 每组只做一次单源搜索;
+分组任务交给进程池; 子进程由 forkserver (不可用时 spawn) 启动, 初始化时映射快照并应用当前的封路规则.
+服务进程是多线程的, 直接 fork 可能让子进程继承其它线程持有的锁 (如缓存、指标的锁) 而死锁
+"""
+import multiprocessing
+import os
+import threading
+from functools import partial
+
+from updates import GraphUpdater
+
+# 进程池子进程中用于计算的路网, 由 _init_worker 构造
+_PARSER = None
+
+
+def _init_worker(factory, rules):
+    global _PARSER
+    _PARSER = factory()
+    if rules: GraphUpdater(_PARSER).set_rules(rules)
+
+
+def _route_group(parser, task):
+    type, slot, start, items, with_paths = task
+    results = parser.one_to_many(start, [pos for _, pos in items], type, slot, with_paths)
+    return [(index, path, dist, cost) for (index, _), (path, dist, cost) in zip(items, results)]
+
+
+def _pool_route_group(task):
+    return _route_group(_PARSER, task)
+
+
+def group_pairs(pairs):
+    """ pairs: [(下标, 起点, 终点, 出行方式, 时段)] -> 分组任务列表 """
+    groups = {}
+    for index, start, end, type, slot in pairs:
+        groups.setdefault((type, slot, tuple(start)), []).append((index, tuple(end)))
+    return [(type, slot, start, items) for (type, slot, start), items in groups.items()]
+
+
+class BatchRouter():
+    def __init__(self, parser, workers=None, factory=None, updater=None):
+        """
+        factory: 可序列化的无参调用, 在子进程中构造与 parser 相同的路网 (如映射同一份快照); 为 None 时在当前进程内计算
+        updater: parser 的 GraphUpdater, 子进程按它当前的规则修改边权
+        """
+        self.parser = parser
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.factory = factory
+        self.updater = updater
+        self.pool = None
+        self.lock = threading.Lock()
+
+    def _get_pool(self):
+        # 首次使用时才创建; 路网更新后由 reset 丢弃, 下次使用时按当时的规则重建
+        with self.lock:
+            if self.pool is None and self.workers > 1 and self.factory is not None:
+                methods = multiprocessing.get_all_start_methods()
+                ctx = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+                rules = list(self.updater.rules.values()) if self.updater is not None else []
+                self.pool = ctx.Pool(self.workers, initializer=_init_worker, initargs=(self.factory, rules))
+            return self.pool
+
+    def run(self, pairs, with_paths=False):
+        """ 逐个产出 (下标, 坐标路径或 None, 实际距离, 加权代价), 顺序为各组完成的先后 """
+        tasks = [(type, slot, start, items, with_paths) for type, slot, start, items in group_pairs(pairs)]
+        pool = self._get_pool()
+        if pool is None:
+            # 进程内计算显式使用本实例的路网: 热替换期间新旧 BatchRouter 可能同时在不同线程中运行
+            done = map(partial(_route_group, self.parser), tasks)
+        else:
+            done = pool.imap_unordered(_pool_route_group, tasks, chunksize=max(1, len(tasks) // (self.workers * 4)))
+        for group in done:
+            yield from group
+
+    def reset(self):
+        """ 路网更新后调用: 旧进程池处理完已提交的任务后退出, 下次使用时按新规则重新创建 """
+        with self.lock:
+            pool, self.pool = self.pool, None
+        if pool is not None: pool.close()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
@@ -0,0 +1,260 @@
+"""
+性能基准: 在若干规模的合成网格地图和 map_test.osm 上测量
+    加载 (XML 解析 / 完整建图 / 快照映射) 耗时与峰值内存, nearest_node 延迟,
+    各出行方式、各搜索算法的点对点查询延迟分位数, 以及多点漫游延迟随途经点数的变化
+    python backend/benchmark.py                              # 结果写入 benchmark.json
+    python backend/benchmark.py --sizes 20,60 --out new.json --compare old.json
+同一 seed 下查询集固定, 不同提交的结果文件可以直接对比
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from parser import OSMParser, read_osm
+from graph import ALGORITHMS
+from tour import solve as solve_tour
+
+OSM_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "map_test.osm")
+ORIGIN = (31.3100, 121.3850) # 合成地图左下角, 位于校园附近
+STEP = 0.0004 # 网格间距 (度), 约 40 米
+
+
+def synthetic_osm(path, size, seed=0):
+    """
+    size x size 的道路网格: 偶数行列为可骑行的 service 道路, 其余为 footway, 少量随机断开;
+    每个网格单元里放一栋带名字的方形建筑, 外加零星具名 POI
+    """
+    rng = random.Random(seed)
+    lat0, lon0 = ORIGIN
+    span = STEP * (size - 1)
+    nid = lambda r, c: r * size + c + 1
+    next_id = size * size + 1
+    lines = ['<?xml version="1.0" encoding="UTF-8"?>', '<osm version="0.6">',
+             f'<bounds minlat="{lat0 - STEP}" minlon="{lon0 - STEP}" maxlat="{lat0 + span + STEP}" maxlon="{lon0 + span + STEP}"/>']
+    for r in range(size):
+        for c in range(size):
+            lines.append(f'<node id="{nid(r, c)}" lat="{lat0 + r * STEP:.7f}" lon="{lon0 + c * STEP:.7f}"/>')
+
+    ways, way_id = [], 1
+    def way(refs, tags):
+        nonlocal way_id
+        body = "".join(f'<nd ref="{x}"/>' for x in refs) + "".join(f'<tag k="{k}" v="{v}"/>' for k, v in tags)
+        ways.append(f'<way id="{way_id}">{body}</way>')
+        way_id += 1
+    for r in range(size):
+        for c in range(size - 1):
+            if rng.random() < 0.05: continue
+            way([nid(r, c), nid(r, c + 1)], [("highway", "service" if r % 2 == 0 else "footway")])
+    for c in range(size):
+        for r in range(size - 1):
+            if rng.random() < 0.05: continue
+            way([nid(r, c), nid(r + 1, c)], [("highway", "service" if c % 2 == 0 else "footway")])
+
+    q = STEP / 4
+    for r in range(size - 1):
+        for c in range(size - 1):
+            clat, clon = lat0 + (r + 0.5) * STEP, lon0 + (c + 0.5) * STEP
+            refs = []
+            for dlat, dlon in ((-q, -q), (-q, q), (q, q), (q, -q)):
+                lines.append(f'<node id="{next_id}" lat="{clat + dlat:.7f}" lon="{clon + dlon:.7f}"/>')
+                refs.append(next_id)
+                next_id += 1
+            way(refs + refs[:1], [("building", "yes"), ("name", f"楼{r}-{c}")])
+            if rng.random() < 0.02:
+                lines.append(f'<node id="{next_id}" lat="{clat:.7f}" lon="{clon + q:.7f}"><tag k="name" v="点{r}-{c}"/></node>')
+                next_id += 1
+    lines += ways
+    lines.append("</osm>")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines))
+
+
+def percentiles(samples):
+    """ 毫秒: p50/p90/p99/max/mean """
+    s = sorted(samples)
+    pick = lambda p: s[min(len(s) - 1, int(p * len(s)))] * 1000
+    return {"n": len(s), "p50": pick(0.5), "p90": pick(0.9), "p99": pick(0.99),
+            "max": s[-1] * 1000, "mean": sum(s) / len(s) * 1000}
+
+
+def quiet(func, *args, **kwargs):
+    """ OSMParser 加载时会打印进度, 基准输出中屏蔽掉 """
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args, **kwargs)
+
+
+def bench_load(path, landmarks):
+    out = {"file_bytes": os.path.getsize(path)}
+    start = time.perf_counter()
+    read_osm(path)
+    out["parse_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    parser = quiet(OSMParser, path, landmarks=landmarks, cache_size=0)
+    out["build_s"] = time.perf_counter() - start
+
+    tracemalloc.start()
+    quiet(OSMParser, path, landmarks=landmarks, cache_size=0)
+    out["peak_mem_mb"] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        snap = os.path.join(tmp, "map.snapshot")
+        quiet(OSMParser, path, snapshot_path=snap, landmarks=landmarks, cache_size=0)
+        start = time.perf_counter()
+        quiet(OSMParser, path, snapshot_path=snap, landmarks=landmarks, cache_size=0)
+        out["snapshot_load_s"] = time.perf_counter() - start
+
+    out["nodes"] = {"walk": len(parser.graphs[1]), "bike": len(parser.graphs[2])}
+    out["buildings"] = len(parser.building_info_list)
+    return parser, out
+
+
+def bench_nearest(parser, rng, count):
+    points = [(rng.uniform(parser.minlat, parser.maxlat), rng.uniform(parser.minlon, parser.maxlon)) for _ in range(count)]
+    out = {}
+    for name, tp in (("walk", 1), ("bike", 2)):
+        samples = []
+        for lat, lon in points:
+            start = time.perf_counter()
+            parser.nearest_node(tp, lat, lon)
+            samples.append(time.perf_counter() - start)
+        out[name] = percentiles(samples)
+    return out
+
+
+def bench_routes(parser, queries, algorithms):
+    out = {}
+    for name, tp in (("walk", 1), ("bike", 2)):
+        out[name] = {}
+        for algorithm in algorithms:
+            samples = []
+            for a, b in queries:
+                start = time.perf_counter()
+                parser.Shortest_path_pos(a, b, tp, algorithm)
+                samples.append(time.perf_counter() - start)
+            out[name][algorithm] = percentiles(samples)
+    return out
+
+
+def bench_tours(parser, locs, rng, stop_counts, repeat):
+    """ 与 /api/find_tour 相同的流程: 代价矩阵 -> 求访问顺序 -> 逐段取路径 """
+    out = {}
+    for k in stop_counts:
+        if k + 1 > len(locs): break
+        samples, methods = [], set()
+        for _ in range(repeat):
+            points = rng.sample(locs, k + 1)
+            start = time.perf_counter()
+            dist = parser.distance_matrix(points, points, 1)
+            order, _, method, _ = solve_tour(dist)
+            curr = points[0]
+            for i in order:
+                parser.Timed_path_pos(curr, points[i], 1)
+                curr = points[i]
+            samples.append(time.perf_counter() - start)
+            methods.add(method)
+        out[str(k)] = dict(percentiles(samples), method="/".join(sorted(methods)))
+    return out
+
+
+def bench_map(label, path, args):
+    rng = random.Random(args.seed)
+    parser, load = bench_load(path, args.landmarks)
+    locs = [(n.lat, n.lon) for _, (_, n), _ in parser.building_info_list if n is not None]
+    queries = [(rng.choice(locs), rng.choice(locs)) for _ in range(args.queries)]
+    result = {
+        "map": label,
+        "load": load,
+        "nearest_node": bench_nearest(parser, rng, args.queries),
+        "route": bench_routes(parser, queries, args.algorithms),
+        "tour": bench_tours(parser, locs, rng, args.stops, args.tour_repeat),
+    }
+    print(f"{label:>12}  nodes={load['nodes']['walk']:<7} build={load['build_s']:.3f}s "
+          f"snapshot={load['snapshot_load_s']:.3f}s peak={load['peak_mem_mb']:.1f}MB")
+    return result
+
+
+def flatten(prefix, obj, out):
+    if isinstance(obj, dict):
+        for k, v in obj.items(): flatten(f"{prefix}.{k}" if prefix else k, v, out)
+    elif isinstance(obj, (int, float)):
+        out[prefix] = obj
+    return out
+
+
+def compare(old, new):
+    """ 打印两份结果中同名耗时/内存指标的相对变化 """
+    old_maps = {m["map"]: m for m in old["maps"]}
+    for m in new["maps"]:
+        if m["map"] not in old_maps: continue
+        a, b = flatten("", old_maps[m["map"]], {}), flatten("", m, {})
+        for key in sorted(a.keys() & b.keys()):
+            if not key.endswith(("_s", "_mb", ".p50", ".p90", ".p99")) or not a[key]: continue
+            change = (b[key] - a[key]) / a[key] * 100
+            print(f"{m['map']:>12}  {key:<40} {a[key]:>10.3f} -> {b[key]:>10.3f}  {change:+6.1f}%")
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="20,50,100", help="合成网格边长, 逗号分隔; 留空则只测真实地图")
+    ap.add_argument("--no-real", action="store_true", help="跳过 map_test.osm")
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--algorithms", default=",".join(ALGORITHMS))
+    ap.add_argument("--stops", default="2,4,6,8,10,12,16")
+    ap.add_argument("--tour-repeat", type=int, default=5)
+    ap.add_argument("--landmarks", type=int, default=8)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default="benchmark.json")
+    ap.add_argument("--compare", help="上一次的结果文件, 打印各指标变化")
+    args = ap.parse_args()
+    args.algorithms = [a for a in args.algorithms.split(",") if a]
+    if any(a not in ALGORITHMS for a in args.algorithms): ap.error(f"algorithms must be in {ALGORITHMS}")
+    if "alt" in args.algorithms and args.landmarks <= 0: args.algorithms.remove("alt")
+    args.stops = [int(k) for k in args.stops.split(",") if k]
+
+    maps = []
+    if not args.no_real:
+        maps.append(bench_map("map_test", OSM_FILE, args))
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in (int(s) for s in args.sizes.split(",") if s):
+            path = os.path.join(tmp, f"grid{size}.osm")
+            synthetic_osm(path, size, args.seed)
+            maps.append(bench_map(f"grid{size}", path, args))
+
+    result = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {k: getattr(args, k) for k in ("queries", "algorithms", "stops", "tour_repeat", "landmarks", "seed")},
+        "maps": maps,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"results written to {args.out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), result)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+from array import array
+from bisect import bisect_left
+
+
+class DistanceTable():
+    """
+    建筑接入点之间的全源最短路表 (单一出行方式)
+    nodes[r]       : 第 r 个接入点在 CSR 图中的下标
+    dist[r * k + c]: 接入点 r 到接入点 c 的距离, 不可达为 inf
+    trees[r]       : (tree_nodes, tree_pred), 以接入点 r 为根的最短路树只保留根到各接入点的路径;
+                     tree_nodes 为路径上除根以外的节点 (升序), tree_pred 为对应的前驱
+    快照中各行的树拼接保存为 tree_nodes / tree_pred, 第 r 行位于 [tree_offsets[r], tree_offsets[r+1])
+    """
+    def __init__(self, nodes, dist, tree_offsets, tree_nodes, tree_pred):
+        self.nodes = nodes
+        self.dist = dist
+        self.trees = [(tree_nodes[lo:hi], tree_pred[lo:hi]) for lo, hi in zip(tree_offsets, tree_offsets[1:])]
+        self.row = {v: r for r, v in enumerate(nodes)}
+        self.stale = {} # 过期行 -> 标记时的版本号
+        self.version = 0
+
+    @staticmethod
+    def _search(graph, src, nodes):
+        """ 以 src 为根搜索到所有接入点, 返回 (距离行, 剪枝后的树) """
+        final, pre = graph.single_source(src, targets=nodes)
+        tree = {}
+        for v in nodes:
+            while v in final and v != src and v not in tree:
+                tree[v] = pre[v]
+                v = pre[v]
+        order = sorted(tree)
+        return array('d', (final.get(v, float("inf")) for v in nodes)), \
+            (array('i', order), array('i', (tree[v] for v in order)))
+
+    @classmethod
+    def build(cls, graph, node_indices):
+        nodes = array('q', sorted(set(node_indices)))
+        dist, offsets, tree_nodes, tree_pred = array('d'), array('q', [0]), array('i'), array('i')
+        for src in nodes:
+            row, (order, pred) = cls._search(graph, src, nodes)
+            dist.extend(row)
+            tree_nodes.extend(order); tree_pred.extend(pred)
+            offsets.append(len(tree_nodes))
+        return cls(nodes, dist, offsets, tree_nodes, tree_pred)
+
+    # 快照保存的拼接形式
+    @property
+    def tree_offsets(self):
+        offsets = array('q', [0])
+        for order, _ in self.trees:
+            offsets.append(offsets[-1] + len(order))
+        return offsets
+
+    @property
+    def tree_nodes(self):
+        return array('i', (v for order, _ in self.trees for v in order))
+
+    @property
+    def tree_pred(self):
+        return array('i', (u for _, pred in self.trees for u in pred))
+
+    def pred(self, r, v):
+        """ 第 r 行的树中 v 的前驱, 不在树中 (或为根) 返回 -1 """
+        order, pred = self.trees[r]
+        i = bisect_left(order, v)
+        return pred[i] if i < len(order) and order[i] == v else -1
+
+    def invalidate(self, rows):
+        """ 标记过期的行; 过期行的接入点不再参与查表, 由 refresh 重算后恢复 """
+        self.version += 1
+        for r in rows:
+            self.stale[r] = self.version
+
+    def refresh(self, graph):
+        """ 重算所有过期行; 重算期间又被标记过期的行 (边权再次变化) 保持过期 """
+        k = len(self.nodes)
+        for r in list(self.stale):
+            version = self.stale.get(r)
+            row, tree = self._search(graph, self.nodes[r], self.nodes)
+            self.dist[r * k:(r + 1) * k] = row
+            self.trees[r] = tree
+            if self.stale.get(r) == version: del self.stale[r]
+
+    def affected_rows(self, graph, increased, decreased):
+        """
+        边权变化 (尚未写入 graph) 后最短路可能改变的行
+        increased: 变大的边 (u, v) 集合; decreased: {(u, v): 新边权}; 图下标, 双向都要给出
+        变大的边只影响树上用到它的行 (树只含到接入点的路径);
+        变小的边 (u, v) 在 d(根, u) + 新边权 < d(根, v) 时该行才会变化, d 由端点出发的一次搜索得到 (路网为无向图)
+        """
+        rows, rest = [], []
+        changed = increased | decreased.keys()
+        for r in range(len(self.nodes)):
+            if r in self.stale or any(self.pred(r, v) == u for u, v in changed): rows.append(r)
+            else: rest.append(r)
+        if not decreased or not rest: return rows
+
+        ends = {x for edge in decreased for x in edge}
+        # 端点比待判断的行还多时, 搜索次数不比直接重算这些行少
+        if len(ends) >= len(rest): return rows + rest
+        inf = float("inf")
+        dist = {x: graph.single_source(x, targets=[self.nodes[r] for r in rest])[0] for x in ends}
+        for r in rest:
+            src = self.nodes[r]
+            if any(dist[u].get(src, inf) + w < dist[v].get(src, inf) for (u, v), w in decreased.items()):
+                rows.append(r)
+        return sorted(rows)
+
+    def __contains__(self, v):
+        r = self.row.get(v)
+        return r is not None and r not in self.stale
+
+    def distance(self, src, dst):
+        """ src/dst 为图下标, 均须在表中 """
+        return self.dist[self.row[src] * len(self.nodes) + self.row[dst]]
+
+    def lookup(self, src, dst):
+        """ 返回 (途经图下标列表, 距离); 不可达返回 ([], inf) """
+        d = self.distance(src, dst)
+        if d == float("inf"): return [], d
+        order, pred = self.trees[self.row[src]]
+        route, v = [dst], dst
+        while v != src:
+            v = pred[bisect_left(order, v)]
+            route.append(v)
+        route.reverse()
+        return route, d
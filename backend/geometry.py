@@ -0,0 +1,118 @@
+"""
+批量几何计算: 成批的边长、最近节点与建筑接入点
+安装了 NumPy 时向量化计算, 否则逐个调用标量实现 (结果与逐点调用完全一致);
+NumPy 的三角函数与 math 可能有末位舍入差异, 不影响最短路结果
+单次计算仍使用 spatial.haversine / OSMParser.calculate_distance
+"""
+from array import array
+import weakref
+
+from spatial import EARTH_RADIUS, haversine
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+INF = float("inf")
+_tables = weakref.WeakKeyDictionary()
+
+
+def haversine_many(lat1, lon1, lat2, lon2):
+    """ 四个等长序列, 返回逐对的球面距离 (米), array('d') """
+    if np is None or not len(lat1):
+        return array('d', map(haversine, lat1, lon1, lat2, lon2))
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return array('d', (2 * np.arcsin(np.sqrt(a)) * EARTH_RADIUS).tobytes())
+
+
+def _cell_table(index):
+    """
+    GridIndex 的 CSR 格子表, 只含非空格子; 按索引对象缓存
+    格子编码 (cx - minx) * height + (cy - miny), codes 升序;
+    第 k 个格子内的节点下标 (顺序与 index.cells 相同) 为 members[offsets[k]:offsets[k+1]]
+    """
+    table = _tables.get(index)
+    if table is None:
+        minx, maxx, miny, maxy = index.cell_bounds
+        height = maxy - miny + 1
+        cells = sorted(((cx - minx) * height + (cy - miny), ids) for (cx, cy), ids in index.cells.items())
+        codes = np.array([code for code, _ in cells], dtype=np.int64)
+        offsets = np.zeros(len(cells) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(ids) for _, ids in cells])
+        members = np.fromiter((i for _, ids in cells for i in ids), dtype=np.int64, count=int(offsets[-1]))
+        table = _tables[index] = (codes, offsets, members, height, np.asarray(index.xs), np.asarray(index.ys))
+    return table
+
+
+def nearest_many(index, lats, lons):
+    """
+    一批查询点在 GridIndex 中的最近节点下标, 结果 (含距离相同时的取舍) 与逐点调用 index.nearest 一致; 索引为空时为 None
+    NumPy 下所有查询点同步逐圈扩展, 每圈每个格子偏移只做一次数组运算
+    """
+    if not len(index): return [None] * len(lats)
+    if np is None or not len(lats):
+        return [index.nearest(lat, lon)[0] for lat, lon in zip(lats, lons)]
+    codes, offsets, members, height, xs, ys = _cell_table(index)
+    minx, maxx, miny, maxy = index.cell_bounds
+    qx = np.asarray(lons, dtype=np.float64) * index.kx
+    qy = np.asarray(lats, dtype=np.float64) * index.ky
+    cx = np.floor(qx / index.cell).astype(np.int64)
+    cy = np.floor(qy / index.cell).astype(np.int64)
+    rmax = int(max(np.abs(cx - minx).max(), np.abs(maxx - cx).max(), np.abs(cy - miny).max(), np.abs(maxy - cy).max()))
+
+    best_d2 = np.full(len(qx), INF)
+    best_i = np.full(len(qx), -1, dtype=np.int64)
+    active = np.arange(len(qx))
+    for r in range(rmax + 1):
+        for dx, dy in index._ring(0, 0, r):
+            X, Y = cx[active] + dx - minx, cy[active] + dy - miny
+            code = X * height + Y
+            k = np.minimum(np.searchsorted(codes, code), len(codes) - 1)
+            ok = (X >= 0) & (X <= maxx - minx) & (Y >= 0) & (Y < height) & (codes[k] == code)
+            q, k = active[ok], k[ok]
+            if not len(q): continue
+            # 各查询点所在格子的节点展开成一维, group 为所属查询点的序号
+            counts = offsets[k + 1] - offsets[k]
+            group = np.repeat(np.arange(len(q)), counts)
+            starts = np.cumsum(counts) - counts
+            cand = members[offsets[k][group] + np.arange(len(group)) - starts[group]]
+            d2 = (xs[cand] - qx[q[group]]) ** 2 + (ys[cand] - qy[q[group]]) ** 2
+            # 每组取距离最小且最靠前的一个, 与逐点调用的取舍一致
+            dmin = np.minimum.reduceat(d2, starts)
+            hit = d2 == dmin[group]
+            _, first = np.unique(group[hit], return_index=True)
+            j = np.flatnonzero(hit)[first]
+            better = dmin < best_d2[q]
+            best_d2[q[better]] = dmin[better]
+            best_i[q[better]] = cand[j][better]
+        # 第 r 圈之外的点距离至少为 r * cell
+        active = active[~(best_d2[active] <= (r * index.cell) ** 2)]
+        if not len(active): break
+    return [int(i) if i >= 0 else None for i in best_i]
+
+
+def access_points(index, lats, lons, polygons):
+    """
+    建筑接入点: 每个多边形 (顶点 (lat, lon) 列表) 取各顶点最近节点中球面距离最小的一个, 距离相同时顶点靠前者优先
+    lats/lons 为路网节点坐标 (与 index 下标对应); 返回 [(节点下标, 距离)], 空多边形为 (None, inf)
+    """
+    points = [p for polygon in polygons for p in polygon]
+    plat, plon = [p[0] for p in points], [p[1] for p in points]
+    near = nearest_many(index, plat, plon)
+    found = [k for k, i in enumerate(near) if i is not None]
+    dist = [INF] * len(points)
+    lengths = haversine_many([lats[near[k]] for k in found], [lons[near[k]] for k in found],
+                             [plat[k] for k in found], [plon[k] for k in found])
+    for k, d in zip(found, lengths):
+        dist[k] = d
+
+    out, start = [], 0
+    for polygon in polygons:
+        best = (None, INF)
+        for k in range(start, start + len(polygon)):
+            if dist[k] < best[1]: best = (near[k], dist[k])
+        out.append(best)
+        start += len(polygon)
+    return out
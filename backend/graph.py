@@ -0,0 +1,299 @@
+from array import array
+import copy
+import heapq
+import sys
+from spatial import haversine
+
+ALGORITHMS = ("dijkstra", "astar", "bidijkstra", "biastar", "alt")
+INF = float("inf")
+
+# 启发函数略微缩小, 抵消浮点舍入, 保证一致性从而结果严格最优
+HEURISTIC_SCALE = 1 - 1e-9
+
+
+class CSRGraph():
+    """
+    紧凑的 CSR (压缩稀疏行) 路网图, 每种出行方式一份
+    ids[i]       : 第 i 个节点的 OSM id
+    lat/lon[i]   : 坐标
+    邻接         : targets[offsets[i]:offsets[i+1]] 与 weights 同位置对应边长 (米)
+    landmark_dist: 可选的 ALT 预处理结果, 第 l 个地标到节点 v 的距离位于 [l * n + v], 不可达为 inf
+    lengths      : 原始边长, 路线距离按它计; 在线更新 (封路/调整权重) 改写 weights 前另存一份, 否则与 weights 是同一数组
+    """
+    def __init__(self, ids, lat, lon, offsets, targets, weights, landmark_dist=None):
+        self.ids = ids
+        self.lat = lat
+        self.lon = lon
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+        self.lengths = weights
+        self.landmark_dist = landmark_dist if landmark_dist is not None else array('d')
+        self.index = {nid: i for i, nid in enumerate(ids)}
+
+    @classmethod
+    def from_nodes(cls, nodelist, type):
+        """ 由 (id, node) 有序列表构建, type 1 = 步行, 2 = 骑行 """
+        ids, lat, lon = array('q'), array('d'), array('d')
+        for nid, nd in nodelist:
+            ids.append(nid); lat.append(nd.lat); lon.append(nd.lon)
+        index = {nid: i for i, nid in enumerate(ids)}
+
+        offsets, targets, weights = array('q', [0]), array('q'), array('d')
+        for _, nd in nodelist:
+            connections = nd.connection_nodes_type1 if type == 1 else nd.connection_nodes_type2
+            for next_id, _, distance, _ in connections:
+                j = index.get(next_id)
+                if j is None: continue
+                targets.append(j); weights.append(distance)
+            offsets.append(len(targets))
+        return cls(ids, lat, lon, offsets, targets, weights)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def coord(self, i):
+        return (self.lat[i], self.lon[i])
+
+    def with_weights(self, weights):
+        """ 共享拓扑与坐标、只替换边权的视图 (用于分时段边权); 新边权须不小于原边权, 启发函数才仍然可采纳 """
+        view = copy.copy(self)
+        view.weights = weights
+        return view
+
+    def edge_weight(self, u, v, weights=None):
+        """ u -> v 的边权 (取最小的平行边), 可指定另一份同拓扑边权 """
+        weights = self.weights if weights is None else weights
+        return min(weights[k] for k in range(self.offsets[u], self.offsets[u + 1]) if self.targets[k] == v)
+
+    def path_length(self, route, weights=None):
+        return sum(self.edge_weight(u, v, weights) for u, v in zip(route, route[1:]))
+
+    def neighbours(self, i):
+        """ 返回 (邻居下标, 边长) 迭代器 """
+        lo, hi = self.offsets[i], self.offsets[i + 1]
+        return zip(self.targets[lo:hi], self.weights[lo:hi])
+
+    @property
+    def landmark_count(self):
+        return len(self.landmark_dist) // len(self.ids) if len(self.ids) else 0
+
+    def route(self, src, dst, algorithm="dijkstra", stats=None):
+        """
+        按 ALGORITHMS 中的名称选择搜索引擎, 结果均为精确最短路; 未做地标预处理时 alt 退化为 A*
+        stats 为字典时写入本次搜索的确定节点数 settled 与松弛边数 relaxed
+        """
+        if algorithm == "alt" and self.landmark_count: return self.astar(src, dst, self.landmark_heuristic(src, dst), stats)
+        if algorithm in ("astar", "alt"): return self.astar(src, dst, stats=stats)
+        if algorithm == "bidijkstra": return self.bidirectional(src, dst, stats=stats)
+        if algorithm == "biastar": return self.bidirectional(src, dst, goal_directed=True, stats=stats)
+        return self.shortest_path(src, dst, stats)
+
+    def _record(self, stats, *settled):
+        """ 搜索结束后统计: 松弛边数即已确定节点的出边总数, 不在内层循环计数 """
+        offsets = self.offsets
+        stats["settled"] = sum(len(s) for s in settled)
+        stats["relaxed"] = sum(offsets[u + 1] - offsets[u] for s in settled for u in s)
+
+    def heuristic_to(self, dst):
+        """ 以到 dst 的球面直线距离作启发函数 (可采纳且一致, 因为边长本身就是端点间球面距离) """
+        lat, lon = self.lat, self.lon
+        tlat, tlon = lat[dst], lon[dst]
+        return lambda i: haversine(lat[i], lon[i], tlat, tlon) * HEURISTIC_SCALE
+
+    def shortest_path(self, src, dst, stats=None):
+        """
+        堆优化 Dijkstra, 到达终点即停止
+        输入/输出均为图内下标; 不可达时返回 ([], sys.maxsize)
+        """
+        offsets, targets, weights = self.offsets, self.targets, self.weights
+        dist = {src: 0.0}
+        pre = {src: -1}
+        settled = set()
+        heap = [(0.0, src)]
+
+        while heap:
+            d, u = heapq.heappop(heap)
+            if u in settled: continue
+            settled.add(u)
+            if u == dst: break
+            for k in range(offsets[u], offsets[u + 1]):
+                v = targets[k]
+                alt = d + weights[k]
+                if alt < dist.get(v, sys.maxsize):
+                    dist[v] = alt
+                    pre[v] = u
+                    heapq.heappush(heap, (alt, v))
+
+        if stats is not None: self._record(stats, settled)
+        if dst not in settled: return [], sys.maxsize
+        return self._unwind(pre, dst), dist[dst]
+
+    def single_source(self, src, targets=None, max_dist=INF, stats=None):
+        """
+        单源 Dijkstra, 返回 (dist, pre) 两个字典 (只含已确定最短距离的节点)
+        targets 非空时全部确定后提前结束; 超过 max_dist 的节点不再扩展
+        """
+        offsets, adj, weights = self.offsets, self.targets, self.weights
+        remaining = set(targets) if targets is not None else None
+        dist, pre, final = {src: 0.0}, {src: -1}, {}
+        heap = [(0.0, src)]
+
+        while heap:
+            d, u = heapq.heappop(heap)
+            if u in final: continue
+            if d > max_dist: break
+            final[u] = d
+            if remaining is not None:
+                remaining.discard(u)
+                if not remaining: break
+            for k in range(offsets[u], offsets[u + 1]):
+                v = adj[k]
+                alt = d + weights[k]
+                if alt < dist.get(v, INF):
+                    dist[v] = alt
+                    pre[v] = u
+                    heapq.heappush(heap, (alt, v))
+        if stats is not None: self._record(stats, final)
+        return final, {u: pre[u] for u in final}
+
+    def build_landmarks(self, count=8):
+        """
+        ALT 预处理: 最远点法选取地标, 每个地标做一次全图 Dijkstra
+        无向图中 |d(L, t) - d(L, v)| 是 d(v, t) 的下界, 且满足一致性
+        """
+        n = len(self.ids)
+        self.landmark_dist = array('d')
+        if n == 0 or count <= 0: return
+        # 从 0 号节点出发的最远点作为第一个地标, 此后每次选离已有地标最远的节点
+        dist0, _ = self.single_source(0)
+        chosen = [max(dist0, key=dist0.get)]
+        closest = [INF] * n
+        while True:
+            dist, _ = self.single_source(chosen[-1])
+            row = array('d', [INF]) * n
+            for v, d in dist.items():
+                row[v] = d
+                if d < closest[v]: closest[v] = d
+            self.landmark_dist.extend(row)
+            if len(chosen) >= count: break
+            # 其它连通分量中的节点 closest 为 inf, 会被优先选为地标
+            far = max(range(n), key=closest.__getitem__)
+            if closest[far] == 0: break # 地标已覆盖所有节点
+            chosen.append(far)
+
+    def landmark_heuristic(self, src, dst, active=4):
+        """ 选取对 (src, dst) 下界最紧的若干地标, 返回 ALT 启发函数 (与球面距离取最大值) """
+        n, D = len(self.ids), self.landmark_dist
+        rows = []
+        for l in range(self.landmark_count):
+            ds, dt = D[l * n + src], D[l * n + dst]
+            if ds == INF or dt == INF: continue # 该地标与起终点不连通, 不提供信息
+            rows.append((abs(dt - ds), l * n, dt))
+        rows = [(base, dt) for _, base, dt in sorted(rows, reverse=True)[:active]]
+        h_geo = self.heuristic_to(dst)
+
+        def h(v):
+            best = h_geo(v)
+            for base, dt in rows:
+                dv = D[base + v]
+                if dv == INF: continue
+                b = abs(dt - dv) * HEURISTIC_SCALE
+                if b > best: best = b
+            return best
+        return h
+
+    def astar(self, src, dst, h=None, stats=None):
+        """ A*: 以 g + h 为堆键, 默认 h 为到终点的球面距离 """
+        offsets, targets, weights = self.offsets, self.targets, self.weights
+        if h is None: h = self.heuristic_to(dst)
+        dist = {src: 0.0}
+        pre = {src: -1}
+        settled = set()
+        heap = [(h(src), src)]
+
+        while heap:
+            _, u = heapq.heappop(heap)
+            if u in settled: continue
+            settled.add(u)
+            if u == dst: break
+            d = dist[u]
+            for k in range(offsets[u], offsets[u + 1]):
+                v = targets[k]
+                alt = d + weights[k]
+                if alt < dist.get(v, sys.maxsize):
+                    dist[v] = alt
+                    pre[v] = u
+                    heapq.heappush(heap, (alt + h(v), v))
+
+        if stats is not None: self._record(stats, settled)
+        if dst not in settled: return [], sys.maxsize
+        return self._unwind(pre, dst), dist[dst]
+
+    def bidirectional(self, src, dst, goal_directed=False, stats=None):
+        """
+        双向 Dijkstra / 双向 A*
+        路网为无向图, 反向搜索直接复用正向邻接表
+        goal_directed 时采用平均势函数 p(v) = (h_t(v) - h_s(v)) / 2, 正反两侧的约化边权均非负;
+        当两侧堆顶之和不小于当前最优相遇长度 mu 时停止
+        """
+        if src == dst:
+            if stats is not None: self._record(stats, (src,))
+            return [src], 0.0
+        offsets, targets, weights = self.offsets, self.targets, self.weights
+        if goal_directed:
+            ht, hs = self.heuristic_to(dst), self.heuristic_to(src)
+            cache = {}
+            def pot(i):
+                p = cache.get(i)
+                if p is None:
+                    p = cache[i] = (ht(i) - hs(i)) / 2
+                return p
+        else:
+            pot = lambda i: 0.0
+        # 正向堆键 d_f(v) + p(v), 反向堆键 d_b(v) - p(v)
+        signs = (1.0, -1.0)
+        dist = ({src: 0.0}, {dst: 0.0})
+        pre = ({src: -1}, {dst: -1})
+        settled = (set(), set())
+        heaps = ([(pot(src), src)], [(-pot(dst), dst)])
+        mu, meet = sys.maxsize, -1
+
+        while heaps[0] and heaps[1]:
+            # 正反堆键之和中势函数恰好抵消, 可直接与 mu 比较
+            if heaps[0][0][0] + heaps[1][0][0] >= mu: break
+            side = 0 if len(heaps[0]) <= len(heaps[1]) else 1
+            _, u = heapq.heappop(heaps[side])
+            if u in settled[side]: continue
+            settled[side].add(u)
+            d_this, d_other = dist[side], dist[1 - side]
+            sign = signs[side]
+            d = d_this[u]
+            for k in range(offsets[u], offsets[u + 1]):
+                v = targets[k]
+                alt = d + weights[k]
+                if alt < d_this.get(v, sys.maxsize):
+                    d_this[v] = alt
+                    pre[side][v] = u
+                    heapq.heappush(heaps[side], (alt + sign * pot(v), v))
+                if v in d_other and alt + d_other[v] < mu:
+                    mu, meet = alt + d_other[v], v
+
+        if stats is not None: self._record(stats, *settled)
+        if meet == -1: return [], sys.maxsize
+        route = self._unwind(pre[0], meet)
+        u = pre[1][meet]
+        while u != -1:
+            route.append(u)
+            u = pre[1][u]
+        return route, mu
+
+    @staticmethod
+    def _unwind(pre, dst):
+        route = []
+        u = dst
+        while u != -1:
+            route.append(u)
+            u = pre[u]
+        route.reverse()
+        return route
@@ -0,0 +1,91 @@
+"""
+后台加载路网
+HTTP 服务先启动, 路网在后台线程中分阶段构建, 构建完成后整体替换当前使用的一份;
+重新加载 (热替换) 期间旧的一份继续服务. 替换只是一次引用赋值, 进行中的请求在开始时已取得旧引用, 不受影响,
+旧的一份在替换后交给 retire 回调 (如关闭其进程池), 其余对象随最后一个引用释放
+"""
+import threading
+import time
+import traceback
+
+
+class GraphLoader():
+    def __init__(self, build, retire=None):
+        """
+        build : build(progress) -> 新的一份; 构建过程中调用 progress(阶段名) 标记进入下一阶段
+        retire: retire(旧的一份), 热替换后调用
+        """
+        self.build = build
+        self.retire = retire
+        self.current = None
+        self.generation = 0
+        self.loading = False
+        self.error = None
+        self.loaded_at = None
+        self.stages = [] # 最近一次加载的 [阶段名, 开始时刻, 耗时 (进行中为 None)]
+        self.lock = threading.Lock()
+        self.done = threading.Event() # 首次加载结束 (无论成败)
+
+    def start(self):
+        """ 开始一次后台加载; 已有加载在进行时返回 False """
+        with self.lock:
+            if self.loading: return False
+            self.loading = True
+            self.error = None
+            self.stages = []
+        threading.Thread(target=self._run, name="graph-loader", daemon=True).start()
+        return True
+
+    def _finish_stage(self, now):
+        if self.stages and self.stages[-1][2] is None:
+            self.stages[-1][2] = now - self.stages[-1][1]
+
+    def _progress(self, stage):
+        now = time.monotonic()
+        with self.lock:
+            self._finish_stage(now)
+            self.stages.append([stage, now, None])
+
+    def _run(self):
+        try:
+            state = self.build(self._progress)
+        except Exception as e:
+            # 加载失败时保留旧的一份继续服务
+            traceback.print_exc()
+            with self.lock:
+                self._finish_stage(time.monotonic())
+                self.error = f"{type(e).__name__}: {e}"
+                self.loading = False
+            self.done.set()
+            return
+        with self.lock:
+            self._finish_stage(time.monotonic())
+            old, self.current = self.current, state
+            self.generation += 1
+            self.loaded_at = time.time()
+            self.loading = False
+        self.done.set()
+        if old is not None and self.retire is not None: self.retire(old)
+
+    def wait(self, timeout=None):
+        """ 等待首次加载结束, 返回是否已有可用的一份 """
+        self.done.wait(timeout)
+        return self.current is not None
+
+    @property
+    def ready(self):
+        return self.current is not None
+
+    def status(self):
+        with self.lock:
+            now = time.monotonic()
+            return {
+                "ready": self.current is not None,
+                "loading": self.loading,
+                "generation": self.generation,
+                "loaded_at": self.loaded_at,
+                "error": self.error,
+                "stage": self.stages[-1][0] if self.loading and self.stages else None,
+                "stages": [{"name": name, "seconds": (now - start) if took is None else took, "done": took is not None}
+                           for name, start, took in self.stages],
+            }
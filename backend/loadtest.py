@@ -0,0 +1,74 @@
+"""
+并发一致性压测: 同一批查询先对被测目标串行执行一遍, 再并发执行, 并发结果必须与串行结果逐一相同
+    python backend/loadtest.py                       # 进程内多线程直接调用 OSMParser
+    python backend/loadtest.py --url http://127.0.0.1:5000   # 压测运行中的服务 (如 serve.py 多进程部署)
+发现不一致时以非零状态码退出
+"""
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+from urllib.request import urlopen
+
+from settings import finish, open_parser, script_arguments
+
+
+def make_queries(parser, count, seed):
+    """ 在建筑接入点之间随机取起终点 """
+    rng = random.Random(seed)
+    locs = [n for _, (_, n), _ in parser.building_info_list if n is not None]
+    return [((a.lat, a.lon), (b.lat, b.lon)) for a, b in
+            ((rng.choice(locs), rng.choice(locs)) for _ in range(count))]
+
+
+def local_query(parser, q):
+    return [parser.Shortest_path_pos(q[0], q[1], tp) for tp in (1, 2)]
+
+
+def remote_query(url, q):
+    args = urlencode({"start_lat": q[0][0], "start_lon": q[0][1], "end_lat": q[1][0], "end_lon": q[1][1]})
+    with urlopen(f"{url}/api/find_path?{args}", timeout=30) as r:
+        res = json.load(r)
+    return [(res[m]["path"], res[m]["dist"]) for m in ("walk", "bike")]
+
+
+def same(a, b):
+    """ 路径逐点相同且距离一致 (JSON 往返后元组变列表) """
+    for (pa, da), (pb, db) in zip(a, b):
+        if abs(da - db) > 1e-6 or len(pa) != len(pb): return False
+        if any(abs(x[0] - y[0]) > 1e-9 or abs(x[1] - y[1]) > 1e-9 for x, y in zip(pa, pb)): return False
+    return True
+
+
+def main():
+    ap = script_arguments(__doc__)
+    ap.add_argument("--url", help="被测服务地址; 缺省时在进程内测试")
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--threads", type=int, default=16)
+    args = ap.parse_args()
+
+    # 关闭缓存, 保证每个请求都真正执行搜索
+    parser = open_parser(cache_size=0)
+    queries = make_queries(parser, args.queries, args.seed)
+
+    # 串行基准与并发压测针对同一目标, 两个吞吐量才可比
+    run = (lambda q: remote_query(args.url, q)) if args.url else (lambda q: local_query(parser, q))
+    start = time.perf_counter()
+    expected = [run(q) for q in queries]
+    serial = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        actual = list(pool.map(run, queries))
+    concurrent = time.perf_counter() - start
+
+    mismatches = sum(1 for a, b in zip(expected, actual) if not same(a, b))
+    print(f"queries={len(queries)} threads={args.threads} target={args.url or 'in-process'}")
+    print(f"serial     {serial:.3f}s  {len(queries) / serial:.1f} req/s")
+    print(f"concurrent {concurrent:.3f}s  {len(queries) / concurrent:.1f} req/s")
+    finish(mismatches, "mismatches")
+
+
+if __name__ == "__main__":
+    main()
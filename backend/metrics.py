@@ -0,0 +1,99 @@
+"""
+轻量指标注册表, 以 Prometheus 文本格式导出 (/api/metrics)
+只实现直方图: 各加载/查询阶段耗时、单次搜索的耗时/确定节点数/松弛边数、各接口延迟
+环境变量 NAV_METRICS=0 时关闭, 埋点处只多一次属性判断
+多进程部署 (serve.py / 批量进程池) 时每个进程各自统计
+"""
+from bisect import bisect_left
+import math
+import os
+import threading
+
+TIME_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 4, 16, 64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+def _escape(v):
+    return str(v).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _number(v):
+    if v == math.inf: return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Histogram():
+    def __init__(self, name, help, labelnames=(), buckets=TIME_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.series = {} # 标签值元组 -> [各桶计数 (非累计, 最后一格为 +Inf), 总和, 次数]
+        self.lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        i = bisect_left(self.buckets, value)
+        with self.lock:
+            s = self.series.get(labels)
+            if s is None:
+                s = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            s[0][i] += 1
+            s[1] += value
+            s[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series = sorted((k, ([*v[0]], v[1], v[2])) for k, v in self.series.items())
+        for labels, (counts, total, count) in series:
+            base = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.labelnames, labels))
+            sep = "," if base else ""
+            cumulative = 0
+            for le, c in zip(self.buckets + (math.inf,), counts):
+                cumulative += c
+                lines.append(f'{self.name}_bucket{{{base}{sep}le="{_number(le)}"}} {cumulative}')
+            suffix = f"{{{base}}}" if base else ""
+            lines.append(f"{self.name}_sum{suffix} {_number(total)}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+
+class Registry():
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.metrics = []
+
+    def histogram(self, name, help, labelnames=(), buckets=TIME_BUCKETS):
+        h = Histogram(name, help, labelnames, buckets)
+        self.metrics.append(h)
+        return h
+
+    def render(self):
+        lines = []
+        for m in self.metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry(enabled=os.environ.get("NAV_METRICS", "1") != "0")
+
+PHASE_SECONDS = REGISTRY.histogram(
+    "nav_phase_seconds", "Time spent in each load/query phase (timer-decorated functions).", ("phase",))
+SEARCH_SECONDS = REGISTRY.histogram(
+    "nav_search_seconds", "Graph search time per query, excluding cache and table hits.", ("mode", "algorithm"))
+SEARCH_SETTLED = REGISTRY.histogram(
+    "nav_search_settled_nodes", "Nodes settled per graph search.", ("mode", "algorithm"), COUNT_BUCKETS)
+SEARCH_RELAXED = REGISTRY.histogram(
+    "nav_search_relaxed_edges", "Edges relaxed (scanned from settled nodes) per graph search.", ("mode", "algorithm"), COUNT_BUCKETS)
+REQUEST_SECONDS = REGISTRY.histogram(
+    "nav_http_request_seconds", "API request latency until the response is handed to the server.", ("endpoint", "method", "status"))
+
+MODE_NAMES = {1: "walk", 2: "bike"}
+
+
+def observe_search(type, algorithm, seconds, stats):
+    """ stats 为搜索函数填写的 {"settled": 确定节点数, "relaxed": 松弛边数} """
+    mode = MODE_NAMES.get(type, str(type))
+    SEARCH_SECONDS.observe(seconds, mode, algorithm)
+    SEARCH_SETTLED.observe(stats["settled"], mode, algorithm)
+    SEARCH_RELAXED.observe(stats["relaxed"], mode, algorithm)
@@ -1,17 +1,26 @@
-from xml.dom.minidom import parse
-import xml.dom.minidom
-import bisect
-import math
+from xml.etree.ElementTree import iterparse
+from functools import wraps
 import sys
-from time import time
+from time import perf_counter
+from graph import CSRGraph
+from spatial import GridIndex, haversine
+import geometry
+import snapshot
+from route_cache import RouteCache
+from distance_table import DistanceTable
+from traffic import NORMAL
+from metrics import REGISTRY, PHASE_SECONDS, observe_search
 
 def timer(func):
+    """ 耗时记入 nav_phase_seconds{phase=函数名}; 指标关闭时直接调用 """
+    @wraps(func)
     def func_wrapper(*args, **kwargs):
-        time_start = time()
-        result = func(*args, **kwargs)
-        time_end = time()
-        # print(f'{func.__name__} cost {time_end - time_start}s')
-        return result
+        if not REGISTRY.enabled: return func(*args, **kwargs)
+        time_start = perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            PHASE_SECONDS.observe(perf_counter() - time_start, func.__name__)
     return func_wrapper
 
 class node():
@@ -21,72 +30,128 @@ class node():
         self.lon = lon
         self.connection_nodes_type1 = []
         self.connection_nodes_type2 = []
-        self.pre = None
-        self.distance = sys.maxsize
-
-    # 修复了之前会导致报错的比较逻辑
-    def id_in_connection(self, cn, id):
-        if not cn:
-            return False
-        # 关键修复: 填充元组以匹配长度
-        pos = bisect.bisect_left(cn, (id, node(), 0.0, 0.0))
-        if pos >= len(cn):
-            return False
-        if cn[pos][0] == id:
-            return True
-        else:
-            return False
+        # 不保存任何搜索状态: 最短路的距离/前驱都在每次查询自己的字典里, 多线程并发查询互不干扰
 
-    def add_connection(self, node_id, nd, distance, azimuth, type):
-        if not self.id_in_connection(self.connection_nodes_type1, node_id):
-            bisect.insort(self.connection_nodes_type1,
-                          (node_id, nd, distance, azimuth))
-        if type == 2:
-            if not self.id_in_connection(self.connection_nodes_type2, node_id):
-                bisect.insort(self.connection_nodes_type2,
-                              (node_id, nd, distance, azimuth))
+    def set_connections(self, adj1, adj2):
+        """ 由 {邻居 id: (邻居 node, 距离)} 一次性生成按 id 有序的连接表 """
+        self.connection_nodes_type1 = [(i, nd, d, 0.0) for i, (nd, d) in sorted(adj1.items())]
+        self.connection_nodes_type2 = [(i, nd, d, 0.0) for i, (nd, d) in sorted(adj2.items())]
 
     def __lt__(self, other):
         return self.id < other.id
 
+class OSMData():
+    """ 流式读取 OSM 文件后保留下来的数据, 只包含建图所需字段 """
+    def __init__(self):
+        self.bounds = None     # (minlat, maxlat, minlon, maxlon)
+        self.nodes = []        # [(id, lat, lon)]
+        self.highways = []     # [(highway 标签, [节点 id])]
+        self.buildings = []    # [(名称, [节点 id])]  building/sport/leisure 且有名字的 way
+        self.pois = []         # [(id, 名称, lat, lon)]  有名字的 node
+        self.ways = {}         # {way id: [节点 id]}  仅 highway, 供在线封路按 way id 定位
+
+@timer
+def read_osm(datapath):
+    """ 单次遍历 OSM XML, 处理完一个元素就清空它, 内存只与保留的数据量相关 """
+    data = OSMData()
+    context = iterparse(datapath, events=("start", "end"))
+    _, root = next(context)
+    depth = 0 # 当前元素在 root 之下的层数, 0 为顶层元素 (node/way/relation/bounds)
+    for event, elem in context:
+        if event == "start":
+            depth += 1
+            continue
+        depth -= 1
+        if depth: continue # 顶层元素内部的 tag/nd/member, 随所属元素一起处理
+        tag = elem.tag
+        if tag == "node":
+            _id = int(elem.get("id"))
+            lat, lon = float(elem.get("lat")), float(elem.get("lon"))
+            data.nodes.append((_id, lat, lon))
+            name = None
+            for t in elem.iter("tag"):
+                if t.get("k") == "name": name = t.get("v")
+            if name is not None:
+                data.pois.append((_id, name, lat, lon))
+        elif tag == "way":
+            name, highway_tag, is_building = None, None, False
+            for t in elem.iter("tag"):
+                k = t.get("k")
+                if k == "name": name = t.get("v")
+                elif k == "highway": highway_tag = t.get("v")
+                elif k in ("building", "sport", "leisure"): is_building = True
+            if highway_tag is not None or (is_building and name is not None):
+                refs = [int(nd.get("ref")) for nd in elem.iter("nd")]
+                if highway_tag is not None:
+                    data.highways.append((highway_tag, refs))
+                    data.ways[int(elem.get("id"))] = refs
+                if is_building and name is not None: data.buildings.append((name, refs))
+        elif tag == "bounds":
+            data.bounds = (float(elem.get("minlat")), float(elem.get("maxlat")),
+                           float(elem.get("minlon")), float(elem.get("maxlon")))
+        # 顶层元素 (包括不需要的 relation 等) 处理完毕, 释放已解析的子树
+        root.clear()
+    return data
+
 class OSMParser():
-    def __init__(self, datapath):
+    def __init__(self, datapath, snapshot_path=None, landmarks=0, cache_size=4096, building_table=False,
+                 traffic=None, progress=None):
+        """
+        snapshot_path 非空时优先映射预编译快照, 源文件变化后才重新解析并回写快照
+        landmarks > 0 时为每种出行方式预处理 ALT 地标距离表
+        cache_size 为最短路 LRU 缓存容量 (0 = 不缓存)
+        building_table 为 True 时预计算建筑接入点之间的全源最短路表
+        traffic 为 TrafficModel 时按其时段生成分时段边权
+        progress(阶段名) 在进入各加载阶段时调用, 供后台加载报告进度
+        """
+        self.datapath = datapath
+        self.traffic = traffic
+        self.progress = progress or (lambda stage: None)
+        self.slot_graphs = {}
+        self.way_refs = None # 由快照启动时首次用到才解析
+        self.blocked = {1: set(), 2: set()} # 被封闭的节点 (图下标), 不作为吸附点
+        self.landmarks = landmarks
+        self.building_table = building_table
+        self.tables = {}
+        self.route_cache = RouteCache(cache_size)
         self.nodes = []
+        self.node_index = {}
+        self.nodes_con, self.nodes_con_pro = [], []
+        self.building_name_list = []
+        self.building_info_list = []
         self.building_polygons = {} 
         print(f"Loading map data from {datapath}...")
-        self.load(datapath)
+        if snapshot_path is None:
+            self.load(datapath)
+        else:
+            self.load_cached(datapath, snapshot_path)
         print("Map data loaded and graph built.")
 
     def calculate_distance(self, lat1, lon1, lat2, lon2):
-        lon_1, lat_1, lon_2, lat_2 = map(math.radians, [lon1, lat1, lon2, lat2])
-        dlon = lon_2 - lon_1
-        dlat = lat_2 - lat_1
         # Haversine 公式
-        a = math.sin(dlat / 2) ** 2 + math.cos(lat_1) * math.cos(lat_2) * math.sin(dlon / 2) ** 2
-        c = 2 * math.asin(math.sqrt(a))
-        r = 6371.393 * 1000 # 地球半径（米） 
-        return c * r
+        return haversine(lat1, lon1, lat2, lon2)
 
     def calculate_azimuth(self, lat1, lon1, lat2, lon2):
         return 0.0 # 简化，暂不使用方位角
 
-    def nodes_loc(self, nodelist, id):
-        pos = bisect.bisect_left(nodelist, (id, node()))
-        if pos < len(nodelist) and nodelist[pos][0] == id:
-            return pos
-        else:
-            return None
-
-    def nearest_node(self, nodelist, lat, lon):
-        distlist = []
-        for nd in nodelist:
-            nd_lat, nd_lon = nd[1].lat, nd[1].lon
-            distlist.append(self.calculate_distance(nd_lat, nd_lon, lat, lon))
-        if not distlist: return None, None, sys.maxsize
-        dist = min(distlist)
-        pos = distlist.index(dist)
-        out = nodelist[pos]
-        return out[0], out[1], dist
+    @timer
+    def nearest_node(self, type, lat, lon):
+        """ 借助网格索引查找对应出行方式路网中距 (lat, lon) 最近的节点 """
+        index = self.spatial[type]
+        i, _ = index.nearest(lat, lon)
+        blocked = self.blocked[type]
+        if i in blocked:
+            i = next((j for _, j in index.k_nearest(lat, lon, len(blocked) + 1) if j not in blocked), None)
+        if i is None: return None, None, sys.maxsize
+        graph = self.graphs[type]
+        nd = self.graph_node(graph, i)
+        return nd.id, nd, self.calculate_distance(nd.lat, nd.lon, lat, lon)
+
+    def graph_node(self, graph, i):
+        """ 图下标 -> node; 节点视图已建立时返回其中的对象 (含连接表), 否则临时构造, 不为此触发视图重建 """
+        nid = graph.ids[i]
+        index = vars(self).get("node_index")
+        return (index.get(nid) if index else None) or node(nid, graph.lat[i], graph.lon[i])
 
     def highway_classifier(self, highway_tag):
         type2 = ['tertiary', 'residential', 'service', 'primary', 'secondary', 'unclassified']
@@ -95,120 +160,152 @@ class OSMParser():
         if highway_tag in type1: return 1
         return None
 
-    def nodes_connection_path(self, id1, id2, highway_tag):
-        nodeslist = self.nodes
-        pos1 = self.nodes_loc(nodeslist, id1)
-        pos2 = self.nodes_loc(nodeslist, id2)
-        if pos1 is None or pos2 is None: return
-        nd1, nd2 = nodeslist[pos1][1], nodeslist[pos2][1]
+    def nodes_connection_path(self, id1, id2, highway_tag, edges):
+        nd1, nd2 = self.node_index.get(id1), self.node_index.get(id2)
+        if nd1 is None or nd2 is None: return
         tp = self.highway_classifier(highway_tag)
         if tp is None: return
-        distance = self.calculate_distance(nd1.lat, nd1.lon, nd2.lat, nd2.lon)
-        nd1.add_connection(id2, nd2, distance, 0, tp)
-        nd2.add_connection(id1, nd1, distance, 0, tp)
+        edges.append((nd1, nd2, tp))
+
+    @timer
+    def build_connections(self, edges):
+        """ 批量去重后写入各节点连接表; 骑行道路同时也是步行道路 """
+        adj1, adj2 = {}, {}
+        for nd1, nd2, distance, tp in edges:
+            for a, b in ((nd1, nd2), (nd2, nd1)):
+                adj1.setdefault(a.id, {}).setdefault(b.id, (b, distance))
+                if tp == 2:
+                    adj2.setdefault(a.id, {}).setdefault(b.id, (b, distance))
+        for nid, conn in adj1.items():
+            self.node_index[nid].set_connections(conn, adj2.get(nid, {}))
 
     @timer
     def nodes_dropna(self):
         self.nodes_con = [x for x in self.nodes if len(x[1].connection_nodes_type1)]
         self.nodes_con_pro = [x for x in self.nodes if len(x[1].connection_nodes_type2)]
+        # 紧凑路网: 1 = 步行, 2 = 骑行
+        self.graphs = {1: CSRGraph.from_nodes(self.nodes_con, 1),
+                       2: CSRGraph.from_nodes(self.nodes_con_pro, 2)}
+        self.spatial = {tp: GridIndex(g.lat, g.lon) for tp, g in self.graphs.items()}
+
+    @timer
+    def build_landmarks(self):
+        for graph in self.graphs.values():
+            graph.build_landmarks(self.landmarks)
+
+    @timer
+    def build_tables(self):
+        """ 每种出行方式: 各建筑的接入点, 以及建筑展示坐标在该路网上的吸附点, 两两之间的最短路 """
+        self.tables = {}
+        for tp, graph in self.graphs.items():
+            nodes = set()
+            for _, walk, bike in self.building_info_list:
+                for nid, _ in (walk, bike):
+                    if nid in graph.index: nodes.add(graph.index[nid])
+                shown = walk[1] or bike[1] # 与 /api/locations 返回的坐标一致
+                if shown is not None:
+                    i, _ = self.spatial[tp].nearest(shown.lat, shown.lon)
+                    if i is not None: nodes.add(i)
+            self.tables[tp] = DistanceTable.build(graph, nodes)
 
     @timer
-    def load_ways(self, OSM):
-        _ways = OSM.getElementsByTagName("way")
-        for _way in _ways:
-            flag = "None"
-            highway_tag = None
-            for tag in _way.getElementsByTagName("tag"):
-                if tag.getAttribute("k") == "highway":
-                    flag = "highway"
-                    highway_tag = tag.getAttribute("v")
-            # 建立连接
-            if flag == "highway" and highway_tag is not None:
-                pre = None
-                for nd in _way.getElementsByTagName("nd"):
-                    post = int(nd.getAttribute("ref"))
-                    if pre is not None:
-                        # 将相邻节点加入连接图
-                        self.nodes_connection_path(post, pre, highway_tag)
-                    pre = post
+    def build_slot_graphs(self):
+        self.slot_graphs = {}
+        if self.traffic is None: return
+        for (tp, slot), weights in self.traffic.build_weights(self).items():
+            self.slot_graphs[(tp, slot)] = self.graphs[tp].with_weights(weights)
+
+    def graph_for(self, type, slot=NORMAL):
+        """ 对应时段的图; 该时段无拥堵设置时即为原始图 """
+        return self.slot_graphs.get((type, slot), self.graphs[type])
+
+    def preprocess(self):
+        """ 按配置补齐缺失的预处理结果, 有新计算时返回 True """
+        built = False
+        if any(g.landmark_count != self.landmarks for g in self.graphs.values()):
+            self.build_landmarks(); built = True
+        if self.building_table and not self.tables:
+            self.build_tables(); built = True
+        return built
 
     @timer
-    def load_buildings(self, OSM):
-        nodelist, nodelist_con, nodelist_con_pro = self.nodes, self.nodes_con, self.nodes_con_pro
-        if not nodelist_con: return
-        if not nodelist_con_pro: nodelist_con_pro = nodelist_con
+    def load_ways(self, highways):
+        segments = []
+        for highway_tag, refs in highways:
+            # 建立连接: 将相邻节点加入连接图
+            for pre, post in zip(refs, refs[1:]):
+                self.nodes_connection_path(post, pre, highway_tag, segments)
+        # 所有路段长度一次批量计算
+        lengths = geometry.haversine_many([a.lat for a, _, _ in segments], [a.lon for a, _, _ in segments],
+                                          [b.lat for _, b, _ in segments], [b.lon for _, b, _ in segments])
+        self.build_connections([(a, b, d, tp) for (a, b, tp), d in zip(segments, lengths)])
+
+    def access_points(self, type, polygons):
+        """ 批量求各多边形 (顶点列表) 在对应出行方式路网上的接入点, 返回 [(id, node)], 找不到时为 (None, None) """
+        graph = self.graphs[type]
+        out = []
+        for i, _ in geometry.access_points(self.spatial[type], graph.lat, graph.lon, polygons):
+            if i is None:
+                out.append((None, None))
+                continue
+            nd = self.graph_node(graph, i)
+            out.append((nd.id, nd))
+        return out
+
+    @timer
+    def load_buildings(self, buildings, pois):
+        if not self.nodes_con: return
+        type2 = 2 if self.nodes_con_pro else 1
 
         self.building_name_list = []
         self.building_info_list = [] 
         self.building_polygons = {}
         processed_nodes = set() 
-        _ways = OSM.getElementsByTagName("way")
 
-        for _way in _ways:
-            name = None
-            for tag in _way.getElementsByTagName("tag"):
-                if tag.getAttribute("k") == "name": name = tag.getAttribute("v")
-            
-            # 只有当它是 building 且有名字时才处理
-            is_building = False
-            for tag in _way.getElementsByTagName("tag"):
-                if tag.getAttribute("k") in ["building", "sport", "leisure"]: is_building = True
-
-            if is_building and name is not None:
-                polygon_coords = []
-                nearest_data = [None, None, sys.maxsize, None, None, sys.maxsize] # id1, node1, dist1, id2, node2, dist2
-
-                for nd in _way.getElementsByTagName("nd"):
-                    _id = int(nd.getAttribute("ref"))
-                    processed_nodes.add(_id) 
-                    _pos = self.nodes_loc(nodelist, _id)
-                    if _pos is None: continue
-                    lat, lon = nodelist[_pos][1].lat, nodelist[_pos][1].lon
-                    polygon_coords.append([lat, lon])
-
-                    # 查找接入点
-                    nid1, n1, d1 = self.nearest_node(nodelist_con, lat, lon)
-                    nid2, n2, d2 = self.nearest_node(nodelist_con_pro, lat, lon)
-                    if d1 < nearest_data[2]: nearest_data[0:3] = [nid1, n1, d1]
-                    if d2 < nearest_data[5]: nearest_data[3:6] = [nid2, n2, d2]
-
-                if name not in self.building_name_list and nearest_data[0] is not None:
-                    self.building_name_list.append(name)
-                    self.building_info_list.append((name, (nearest_data[0], nearest_data[1]), (nearest_data[3], nearest_data[4])))
-                    self.building_polygons[name] = polygon_coords
-
-        _nodes = OSM.getElementsByTagName("node")
-        for _node in _nodes:
-             name = None
-             _id = int(_node.getAttribute("id"))
-             if _id in processed_nodes: continue
-             for tag in _node.getElementsByTagName("tag"):
-                 if tag.getAttribute("k") == "name": name = tag.getAttribute("v")
-             if name is not None:
-                 lat, lon = float(_node.getAttribute("lat")), float(_node.getAttribute("lon"))
-                 if not self.check_bounds((lat, lon)): continue
-                 nid1, n1, _ = self.nearest_node(nodelist_con, lat, lon)
-                 nid2, n2, _ = self.nearest_node(nodelist_con_pro, lat, lon)
-                 if name not in self.building_name_list:
-                     self.building_name_list.append(name)
-                     self.building_info_list.append((name, (nid1, n1), (nid2, n2)))
-                     self.building_polygons[name] = []
+        # 只有 building/sport/leisure 且有名字的 way 才会出现在 buildings 中; 所有轮廓的接入点一次批量求出
+        polygons = []
+        for name, refs in buildings:
+            processed_nodes.update(refs)
+            polygons.append([[nd.lat, nd.lon] for nd in map(self.node_index.get, refs) if nd is not None])
+        walk, bike = self.access_points(1, polygons), self.access_points(type2, polygons)
+
+        names = set()
+        for (name, _), polygon_coords, w, b in zip(buildings, polygons, walk, bike):
+            if name not in names and w[0] is not None:
+                names.add(name)
+                self.building_name_list.append(name)
+                self.building_info_list.append((name, w, b))
+                self.building_polygons[name] = polygon_coords
+
+        pois = [(name, [(lat, lon)]) for _id, name, lat, lon in pois
+                if _id not in processed_nodes and self.check_bounds((lat, lon))]
+        points = [p for _, p in pois]
+        for (name, _), w, b in zip(pois, self.access_points(1, points), self.access_points(type2, points)):
+            if name not in names:
+                names.add(name)
+                self.building_name_list.append(name)
+                self.building_info_list.append((name, w, b))
+                self.building_polygons[name] = []
 
     @timer
-    def load_nodes(self, OSM):
-        _nodes = OSM.getElementsByTagName("node")
-        for _node in _nodes:
-            node_id = int(_node.getAttribute("id"))
-            lat = float(_node.getAttribute("lat"))
-            lon = float(_node.getAttribute("lon"))
-            bisect.insort(self.nodes, (node_id, node(node_id, lat, lon)))
-
-    def load_bounds(self, OSM):
-        _bounds = OSM.getElementsByTagName("bounds")
-        if _bounds:
-            bound = _bounds[0]
-            self.minlat, self.maxlat = float(bound.getAttribute("minlat")), float(bound.getAttribute("maxlat"))
-            self.minlon, self.maxlon = float(bound.getAttribute("minlon")), float(bound.getAttribute("maxlon"))
+    def load_nodes(self, nodes_raw):
+        self.node_index = {node_id: node(node_id, lat, lon) for node_id, lat, lon in nodes_raw}
+        # 按 id 有序的 (id, node) 列表视图, 只排序一次
+        self.nodes = [(nid, self.node_index[nid]) for nid in sorted(self.node_index)]
+
+    def highway_refs(self):
+        """ {way id: [节点 id]}; 由快照恢复时不含 way 信息, 首次调用时重新流式读取一遍地图 """
+        if self.way_refs is None:
+            self.way_refs = read_osm(self.datapath).ways
+        return self.way_refs
+
+    def load_bounds(self, bounds, nodes=()):
+        """ 优先使用文件中的 <bounds>, 缺失时取全部节点的外包框 """
+        if not bounds and nodes:
+            lats, lons = [lat for _, lat, _ in nodes], [lon for _, _, lon in nodes]
+            bounds = (min(lats), max(lats), min(lons), max(lons))
+        if bounds:
+            self.minlat, self.maxlat, self.minlon, self.maxlon = bounds
         else:
             self.minlat, self.maxlat, self.minlon, self.maxlon = 31.30, 31.33, 121.38, 121.40
 
@@ -217,70 +314,298 @@ class OSMParser():
 
     @timer
     def load(self, datapath):
-        DOMTree = xml.dom.minidom.parse(datapath)
-        OSM = DOMTree.documentElement
-        self.load_bounds(OSM)
-        self.load_nodes(OSM)
-        self.load_ways(OSM)
+        self.route_cache.clear()
+        self.progress("read_osm")
+        OSM = read_osm(datapath)
+        self.progress("build_graph")
+        self.load_bounds(OSM.bounds, OSM.nodes)
+        self.load_nodes(OSM.nodes)
+        self.load_ways(OSM.highways)
+        self.way_refs = OSM.ways
         self.nodes_dropna()
-        self.load_buildings(OSM)
+        self.progress("buildings")
+        self.load_buildings(OSM.buildings, OSM.pois)
+        self.progress("preprocess")
+        self.preprocess()
+        self.build_slot_graphs()
 
     @timer
-    def Shortest_path_node(self, start_node_tuple, end_node_tuple, type):
-        def node_clear(nl):
-            for nt in nl:
-                nt[1].pre = None; nt[1].distance = sys.maxsize
-        
-        start_node, end_node = start_node_tuple[1], end_node_tuple[1]
-        nodelist = self.nodes_con.copy() if type == 1 else self.nodes_con_pro.copy()
-        
-        # 简单检查起点是否在列表
-        found_start = False
-        for item in nodelist:
-            if item[0] == start_node_tuple[0]: found_start = True; break
-        if not found_start: return [], sys.maxsize
-            
-        node_clear(nodelist)
-        start_node.distance = 0
-        queue = nodelist.copy()
-        
-        while queue:
-            node_proc_tuple = min(queue, key=lambda x: x[1].distance)
-            node_proc = node_proc_tuple[1]
-            queue.remove(node_proc_tuple)
-            if node_proc.distance == sys.maxsize: break
-            if node_proc == end_node: break
-            
-            connections = node_proc.connection_nodes_type1 if type == 1 else node_proc.connection_nodes_type2
-            for nd_next_tuple in connections:
-                nd_next_node, nd_next_dist = nd_next_tuple[1], nd_next_tuple[2]
-                alt = nd_next_dist + node_proc.distance
-                if alt < nd_next_node.distance:
-                    nd_next_node.distance = alt
-                    nd_next_node.pre = node_proc
-
-        if end_node.distance == sys.maxsize: return [], sys.maxsize
-        route = []
-        nd = end_node
-        while nd:
-            route.append(nd)
-            nd = nd.pre
-        route.reverse()
-        return route, end_node.distance
+    def load_cached(self, datapath, snapshot_path):
+        self.progress("snapshot")
+        digest = snapshot.file_digest(datapath)
+        data = snapshot.read(snapshot_path, digest)
+        if data is not None:
+            self.restore(data)
+            # 预处理配置变化时只补算缺失部分并回写快照
+            self.progress("preprocess")
+            rebuilt = self.preprocess()
+            self.build_slot_graphs()
+            if not rebuilt: return
+        else:
+            self.load(datapath)
+        self.progress("save_snapshot")
+        self.save_snapshot(snapshot_path, digest)
+
+    def snapshot_arrays(self):
+        arrays = {}
+        for tp, g in self.graphs.items():
+            arrays[f"graph{tp}"] = {f: getattr(g, f) for f in snapshot.GRAPH_FIELDS}
+        for tp, t in self.tables.items():
+            arrays[f"table{tp}"] = {f: getattr(t, f) for f in snapshot.TABLE_FIELDS}
+        return arrays
+
+    def save_snapshot(self, snapshot_path, digest):
+        buildings = [(name, (wid, wn.lat, wn.lon) if wn else None, (bid, bn.lat, bn.lon) if bn else None)
+                     for name, (wid, wn), (bid, bn) in self.building_info_list]
+        try:
+            snapshot.write(snapshot_path, digest, (self.minlat, self.maxlat, self.minlon, self.maxlon),
+                           self.snapshot_arrays(), buildings, self.building_polygons)
+        except OSError as e:
+            print(f"Warning: failed to write snapshot {snapshot_path}: {e}")
+
+    VIEWS = ("nodes", "node_index", "nodes_con", "nodes_con_pro")
+
+    def __getattr__(self, name):
+        # 由快照恢复时不保存 node 对象, 首次访问这些视图时再由 CSR 数组重建
+        if name in OSMParser.VIEWS and "graphs" in vars(self):
+            self.build_views()
+            return vars(self)[name]
+        raise AttributeError(name)
 
     @timer
-    def Shortest_path_pos(self, start_pos, end_pos, type):
-        if not (self.check_bounds(start_pos) and self.check_bounds(end_pos)): return [], -1
+    def build_views(self):
+        """
+        由 CSR 数组重建 nodes / node_index / nodes_con / nodes_con_pro
+        只含路网节点 (快照不保存建筑轮廓等其它节点), 连接表按图中当前边权
+        """
+        index = {}
+        for graph in self.graphs.values():
+            for i, nid in enumerate(graph.ids):
+                if nid not in index: index[nid] = node(nid, graph.lat[i], graph.lon[i])
+        for tp, graph in self.graphs.items():
+            for i, nid in enumerate(graph.ids):
+                conn = [(graph.ids[j], index[graph.ids[j]], w, 0.0) for j, w in graph.neighbours(i)]
+                if tp == 1: index[nid].connection_nodes_type1 = conn
+                else: index[nid].connection_nodes_type2 = conn
+        self.node_index = index
+        self.nodes = [(nid, index[nid]) for nid in sorted(index)]
+        self.nodes_con = [x for x in self.nodes if len(x[1].connection_nodes_type1)]
+        self.nodes_con_pro = [x for x in self.nodes if len(x[1].connection_nodes_type2)]
+
+    @timer
+    def restore(self, data):
+        """ 由快照恢复路网与建筑表; 快照只包含路由所需数据, node 对象视图在首次访问时才重建 """
+        self.route_cache.clear()
+        for name in self.VIEWS:
+            vars(self).pop(name, None)
+        self.load_bounds(data["bounds"])
+        arrays = data["arrays"]
+        self.graphs = {tp: CSRGraph(**arrays[f"graph{tp}"]) for tp in (1, 2)}
+        self.spatial = {tp: GridIndex(g.lat, g.lon) for tp, g in self.graphs.items()}
+        self.tables = {tp: DistanceTable(**arrays[f"table{tp}"])
+                       for tp in (1, 2) if self.building_table and f"table{tp}" in arrays}
+
+        def access(entry):
+            if entry is None: return (None, None)
+            nid, lat, lon = entry
+            return (nid, node(nid, lat, lon))
+
+        for name, walk, bike in data["buildings"]:
+            self.building_name_list.append(name)
+            self.building_info_list.append((name, access(walk), access(bike)))
+        self.building_polygons = data["polygons"]
+
+    def search(self, graph, type, algorithm, func, *args, **kwargs):
+        """ 执行一次图搜索, 指标开启时记录耗时、确定节点数与松弛边数 """
+        if not REGISTRY.enabled: return func(*args, **kwargs)
+        stats = {}
+        start = perf_counter()
+        result = func(*args, stats=stats, **kwargs)
+        observe_search(type[0] if isinstance(type, tuple) else type, algorithm, perf_counter() - start, stats)
+        return result
+
+    @timer
+    def Shortest_path_node(self, start_node_tuple, end_node_tuple, type, algorithm="dijkstra", slot=NORMAL):
+        """
+        在对应出行方式的 CSR 图上求最短路, 返回 (途经 OSM id 列表, 距离)
+        algorithm: dijkstra / astar / bidijkstra / biastar / alt, 均为精确算法
+        slot 非平峰时在该时段的加权图上搜索, 返回的是加权代价
+        """
+        graph = self.graph_for(type, slot)
+        if graph is not self.graphs[type]: type = (type, slot) # 缓存按时段区分
+        src = graph.index.get(start_node_tuple[0])
+        dst = graph.index.get(end_node_tuple[0])
+        if src is None or dst is None: return [], sys.maxsize
+
+        table = self.tables.get(type)
+        if table is not None and src in table and dst in table: # 加权图的 type 为元组, 不会命中
+            # 两端都是建筑接入点: 查表 + 沿前驱还原路径
+            route, dist = table.lookup(src, dst)
+            if not route: return [], sys.maxsize
+            return [graph.ids[i] for i in route], dist
+
+        # 先记下缓存代数: 搜索期间若有路网更新 (失效缓存), 本次结果不写回
+        generation = self.route_cache.generation
+        cached = self.route_cache.get(start_node_tuple[0], end_node_tuple[0], type)
+        if cached is not None: return cached
+
+        route, dist = self.search(graph, type, algorithm, graph.route, src, dst, algorithm)
+        route = [graph.ids[i] for i in route]
+        self.route_cache.put(start_node_tuple[0], end_node_tuple[0], type, route, dist, generation)
+        return route, dist
+
+    @timer
+    def Shortest_path_pos(self, start_pos, end_pos, type, algorithm="dijkstra"):
+        path, dist, _ = self.Timed_path_pos(start_pos, end_pos, type, NORMAL, algorithm)
+        return path, dist
+
+    @timer
+    def Timed_path_pos(self, start_pos, end_pos, type, slot=NORMAL, algorithm="dijkstra"):
+        """
+        按时段边权求路径, 返回 (坐标路径, 实际距离(米), 加权代价)
+        代价 = 各边长度 x 该时段倍率, 除以速度即为耗时; 失败时距离与代价均为 -1
+        """
+        if not (self.check_bounds(start_pos) and self.check_bounds(end_pos)): return [], -1, -1
         
-        src_list = self.nodes_con if type == 1 else self.nodes_con_pro
-        sid, snode, sdist = self.nearest_node(src_list, start_pos[0], start_pos[1])
-        eid, enode, edist = self.nearest_node(src_list, end_pos[0], end_pos[1])
+        sid, snode, sdist = self.nearest_node(type, start_pos[0], start_pos[1])
+        eid, enode, edist = self.nearest_node(type, end_pos[0], end_pos[1])
+
+        if not snode or not enode: return [], -1, -1
+        # 起终点到路网的接驳段按时段默认倍率计
+        snap_mult = self.traffic.multiplier(slot, type) if self.traffic else 1.0
+        if sid == eid:
+            return [start_pos, (snode.lat, snode.lon), end_pos], sdist + edist, (sdist + edist) * snap_mult
+
+        route, cost = self.Shortest_path_node((sid, snode), (eid, enode), type, algorithm, slot)
+        if cost == sys.maxsize: return [], -1, -1
+
+        graph = self.graphs[type]
+        route = [graph.index[nid] for nid in route]
+        # 路线距离按原始边长计, 不含时段倍率与 reweight 倍率
+        exact = self.graph_for(type, slot) is graph and graph.lengths is graph.weights
+        dist = cost if exact else graph.path_length(route, graph.lengths)
+        path = [start_pos] + [graph.coord(i) for i in route] + [end_pos]
+        return path, dist + sdist + edist, cost + (sdist + edist) * snap_mult
 
-        if not snode or not enode: return [], -1
-        if sid == eid: return [start_pos, (snode.lat, snode.lon), end_pos], sdist + edist
+    @timer
+    def one_to_many(self, start_pos, end_positions, type, slot=NORMAL, with_paths=False):
+        """
+        一个起点到多个终点: 只做一次单源搜索, 所有终点确定后停止
+        返回与 end_positions 对应的 [(坐标路径或 None, 实际距离, 加权代价)], 失败项为 (None, -1, -1)
+        """
+        failed = (None, -1, -1)
+        if not self.check_bounds(start_pos): return [failed] * len(end_positions)
+        base, graph = self.graphs[type], self.graph_for(type, slot)
+        snap_mult = self.traffic.multiplier(slot, type) if self.traffic else 1.0
+        sid, _, sdist = self.nearest_node(type, start_pos[0], start_pos[1])
+        if sid is None: return [failed] * len(end_positions)
+        si = base.index[sid]
+
+        ends = []
+        for pos in end_positions:
+            eid, _, edist = self.nearest_node(type, pos[0], pos[1]) if self.check_bounds(pos) else (None, None, 0.0)
+            ends.append((base.index[eid] if eid is not None else None, edist))
+        final, pre = self.search(graph, type, "single_source", graph.single_source, si,
+                                 targets={ti for ti, _ in ends if ti is not None})
+
+        out = []
+        for pos, (ti, edist) in zip(end_positions, ends):
+            if ti is None or ti not in final:
+                out.append(failed)
+                continue
+            route = CSRGraph._unwind(pre, ti)
+            net = final[ti] if graph is base and base.lengths is base.weights else base.path_length(route, base.lengths)
+            path = [start_pos] + [base.coord(i) for i in route] + [pos] if with_paths else None
+            out.append((path, net + sdist + edist, final[ti] + (sdist + edist) * snap_mult))
+        return out
 
-        route, dist = self.Shortest_path_node((sid, snode), (eid, enode), type)
-        if dist == sys.maxsize: return [], -1
+    @timer
+    def isochrone(self, start_pos, type, max_cost, slot=NORMAL):
+        """
+        有界单源搜索: 从起点吸附节点出发, 加权代价超过 max_cost 的节点不再扩展
+        返回 (可达建筑 [(名称, 接入点 node, 加权代价)], 可达路网节点坐标列表); 越界或无法吸附时返回 None
+        """
+        if not self.check_bounds(start_pos): return None
+        sid, _, sdist = self.nearest_node(type, start_pos[0], start_pos[1])
+        if sid is None: return None
+        graph = self.graph_for(type, slot)
+        snap_cost = sdist * (self.traffic.multiplier(slot, type) if self.traffic else 1.0)
+        if snap_cost > max_cost: return [], []
+        final, _ = self.search(graph, type, "isochrone", graph.single_source, graph.index[sid],
+                               max_dist=max_cost - snap_cost)
+
+        reached = []
+        for info in self.building_info_list:
+            aid, anode = info[type]
+            ai = graph.index.get(aid) if anode else None
+            if ai is not None and ai in final:
+                reached.append((info[0], anode, final[ai] + snap_cost))
+        return reached, [graph.coord(i) for i in final]
 
-        path = [start_pos] + [(nd.lat, nd.lon) for nd in route] + [end_pos]
-        return path, dist + sdist + edist
\ No newline at end of file
+    @timer
+    def distance_matrix(self, sources, targets, type, slot=NORMAL, with_lengths=False):
+        """
+        多对多路网距离矩阵 (米), 每个起点只做一次单源搜索, 所有终点确定后即停止
+        sources/targets 为 (lat, lon) 列表; 越界或不可达处为 -1
+        slot 非平峰时返回该时段的加权代价; 有 reweight 规则时同样是含倍率的代价 (路径规划按代价比较)
+        with_lengths 时返回 (实际距离矩阵, 代价矩阵), 实际距离为代价最小的路线按原始边长计的长度 (与 Timed_path_pos 一致)
+        """
+        graph = self.graph_for(type, slot)
+        base = self.graphs[type]
+        snap_mult = self.traffic.multiplier(slot, type) if self.traffic else 1.0
+        # 无时段倍率与 reweight 时代价即长度, 不必沿路线重新累加
+        exact = graph is base and base.lengths is base.weights
+
+        def snap(pos):
+            if not self.check_bounds(pos): return None, 0.0
+            nid, _, d = self.nearest_node(type, pos[0], pos[1])
+            if nid is None: return None, 0.0
+            return graph.index[nid], d
+
+        src_snap = [snap(p) for p in sources]
+        dst_snap = [snap(p) for p in targets]
+        wanted = {i for i, _ in dst_snap if i is not None}
+
+        table = self.tables.get(type) if graph is self.graphs[type] else None
+        use_table = table is not None and all(i in table for i in wanted)
+
+        matrix, lengths = [], []
+        searched = {} # 同一吸附节点的起点共用一次搜索
+        for si, sd in src_snap:
+            if si is None:
+                matrix.append([-1] * len(targets))
+                lengths.append([-1] * len(targets))
+                continue
+            if si not in searched:
+                if use_table and si in table:
+                    row = ((ti, table.distance(si, ti)) for ti in wanted)
+                    dist = {ti: d for ti, d in row if d != float("inf")}
+                    r = table.row[si]
+                    pred = lambda v, r=r: table.pred(r, v)
+                else:
+                    dist, pre = self.search(graph, type, "single_source", graph.single_source, si, targets=wanted)
+                    pred = pre.__getitem__
+                length = dist if exact or not with_lengths else self._route_lengths(base, pred, si, dist.keys() & wanted)
+                searched[si] = (dist, length)
+            dist, length = searched[si]
+            matrix.append([sd * snap_mult + dist[ti] + td * snap_mult if ti is not None and ti in dist else -1
+                           for ti, td in dst_snap])
+            lengths.append([sd + td + length[ti] if ti is not None and ti in dist else -1
+                            for ti, td in dst_snap])
+        return (lengths, matrix) if with_lengths else matrix
+
+    @staticmethod
+    def _route_lengths(graph, pred, src, ends):
+        """ 沿前驱 pred(v) 上溯, 返回 {节点: 按原始边长计的路线长度}; 各终点共用的前缀只累加一次 """
+        known = {src: 0.0}
+        for v in ends:
+            chain = []
+            while v not in known:
+                u = pred(v)
+                chain.append((u, v))
+                v = u
+            d = known[v]
+            for u, w in reversed(chain):
+                d += graph.edge_weight(u, w, graph.lengths)
+                known[w] = d
+        return known
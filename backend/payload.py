@@ -0,0 +1,70 @@
+"""
+预先序列化并压缩的只读响应
+加载路网后一次性生成 JSON 字节、gzip/brotli 压缩版本与 ETag, 请求时只做协商与返回
+"""
+import gzip
+import hashlib
+import json
+
+from flask import Response
+
+from spatial import simplify
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# /api/locations 的细节级别: full = 完整轮廓, simplified = 简化轮廓, centroid = 只给轮廓中心
+LOCATION_DETAILS = ("full", "simplified", "centroid")
+SIMPLIFY_TOLERANCE = 2.0 # 米
+
+
+class Payload():
+    def __init__(self, obj):
+        self.body = json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self.etag = hashlib.sha1(self.body).hexdigest()
+        self.encoded = {"gzip": gzip.compress(self.body, 9)}
+        if brotli is not None:
+            self.encoded["br"] = brotli.compress(self.body)
+
+    def respond(self, request):
+        headers = {"ETag": f'"{self.etag}"', "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+        if request.if_none_match.contains(self.etag):
+            return Response(status=304, headers=headers)
+        accepted = request.accept_encodings
+        for encoding in ("br", "gzip"):
+            if encoding in self.encoded and accepted[encoding]:
+                headers["Content-Encoding"] = encoding
+                return Response(self.encoded[encoding], mimetype="application/json", headers=headers)
+        return Response(self.body, mimetype="application/json", headers=headers)
+
+
+def centroid(polygon):
+    if not polygon: return None
+    # 闭合轮廓首尾重复, 不重复计入
+    pts = polygon[:-1] if len(polygon) > 1 and polygon[0] == polygon[-1] else polygon
+    return [sum(p[0] for p in pts) / len(pts), sum(p[1] for p in pts) / len(pts)]
+
+
+def build_locations(parser):
+    """ 返回 {细节级别: Payload}, 内容按名称排序 """
+    payloads = {}
+    for detail in LOCATION_DETAILS:
+        locs = []
+        for b in parser.building_info_list:
+            name, wn, bn = b[0], b[1][1], b[2][1]
+            # 只要有步行或骑行接入点即可
+            node = wn if wn else bn
+            if not node: continue
+            polygon = parser.building_polygons.get(name, [])
+            loc = {'name': name, 'lat': node.lat, 'lon': node.lon}
+            if detail == "full":
+                loc['polygon'] = polygon
+            elif detail == "simplified":
+                loc['polygon'] = [list(p) for p in simplify(polygon, SIMPLIFY_TOLERANCE)]
+            else:
+                loc['centroid'] = centroid(polygon) or [node.lat, node.lon]
+            locs.append(loc)
+        payloads[detail] = Payload(sorted(locs, key=lambda x: x['name']))
+    return payloads
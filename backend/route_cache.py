@@ -0,0 +1,66 @@
+from collections import OrderedDict
+import threading
+
+
+class RouteCache():
+    """
+    有界 LRU 路径缓存
+    键: (起点 OSM id, 终点 OSM id, 出行方式), 值: (途经 OSM id 元组, 距离)
+    路网为无向图, 起终点互换的查询共用同一条目, 命中时按需反转路径
+    generation: 每次 discard/clear 加一; 搜索前记下, put 时若已变化说明期间路网有更新, 结果可能过期, 不写入
+    """
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.generation = 0
+        self.hits = self.misses = self.evictions = 0
+
+    @staticmethod
+    def _key(src, dst, type):
+        return (src, dst, type) if src <= dst else (dst, src, type)
+
+    def get(self, src, dst, type):
+        """ 命中返回 (途经 id 列表, 距离), 未命中返回 None """
+        key = self._key(src, dst, type)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        route, dist = entry
+        return (list(route) if key[0] == src else list(reversed(route))), dist
+
+    def put(self, src, dst, type, route, dist, generation=None):
+        """ generation: 搜索开始前读到的 self.generation, 与当前不一致时丢弃 """
+        if self.maxsize <= 0: return
+        key = self._key(src, dst, type)
+        if key[0] != src: route = reversed(route)
+        with self.lock:
+            if generation is not None and generation != self.generation: return
+            self.entries[key] = (tuple(route), dist)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def discard(self, pred):
+        """ 删除 pred(出行方式键, 途经 id 元组) 为真的条目, 返回删除数 """
+        with self.lock:
+            self.generation += 1
+            stale = [key for key, (route, _) in self.entries.items() if pred(key[2], route)]
+            for key in stale:
+                del self.entries[key]
+        return len(stale)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {"size": len(self.entries), "maxsize": self.maxsize,
+                    "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
@@ -0,0 +1,114 @@
+"""
+地点名称检索索引, 加载路网后一次性构建
+    前缀树   : 名称、拼音全拼与拼音首字母 (需安装 pypinyin, 未安装时只索引名称)
+    n-gram   : 名称的单字与双字倒排表, 用于子串与模糊匹配
+排序: 完全匹配 > 名称前缀 > 拼音前缀 > 子串 > 模糊 (命中 n-gram 比例), 同分时名称短者优先
+"""
+import unicodedata
+
+try:
+    from pypinyin import lazy_pinyin
+except ImportError:
+    lazy_pinyin = None
+
+MIN_FUZZY = 0.5 # 模糊匹配至少命中一半的查询 n-gram
+
+
+def normalize(text):
+    """ 全角转半角、英文小写、去空白 """
+    return "".join(unicodedata.normalize("NFKC", text).lower().split())
+
+
+def grams(text):
+    """ 单字 + 相邻双字 """
+    return set(text) | {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def pinyin_keys(name):
+    """ 返回 (全拼, 首字母); 未安装 pypinyin 时为空 """
+    if lazy_pinyin is None: return ()
+    syllables = [normalize(s) for s in lazy_pinyin(name)]
+    syllables = [s for s in syllables if s]
+    return ("".join(syllables), "".join(s[0] for s in syllables))
+
+
+class _Trie():
+    """ 每个节点保存经过它的条目下标, 前缀查询只需沿查询串走一遍 """
+    def __init__(self):
+        self.root = ({}, [])
+
+    def insert(self, key, i):
+        node = self.root
+        for ch in key:
+            node = node[0].setdefault(ch, ({}, []))
+            if not node[1] or node[1][-1] != i: node[1].append(i)
+
+    def prefix(self, key):
+        node = self.root
+        for ch in key:
+            node = node[0].get(ch)
+            if node is None: return ()
+        return node[1]
+
+
+class SearchIndex():
+    def __init__(self, entries):
+        """ entries: [{"name", "lat", "lon", "walk", "bike"}], walk/bike 为接入点坐标或 None """
+        self.entries = entries
+        self.keys = [normalize(e["name"]) for e in entries]
+        self.pinyin = [pinyin_keys(e["name"]) for e in entries]
+        self.names = _Trie()
+        self.spell = _Trie()
+        self.postings = {}
+        for i, key in enumerate(self.keys):
+            self.names.insert(key, i)
+            for k in self.pinyin[i]:
+                self.spell.insert(k, i)
+            for g in grams(key):
+                self.postings.setdefault(g, []).append(i)
+
+    @classmethod
+    def from_parser(cls, parser):
+        entries = []
+        for name, (_, wn), (_, bn) in parser.building_info_list:
+            node = wn if wn else bn
+            if not node: continue
+            entries.append({
+                "name": name, "lat": node.lat, "lon": node.lon,
+                "walk": [wn.lat, wn.lon] if wn else None,
+                "bike": [bn.lat, bn.lon] if bn else None,
+            })
+        return cls(entries)
+
+    def _scores(self, q):
+        """ 返回 {条目下标: (分数, 匹配方式)} """
+        scores = {}
+        def hit(i, score, how):
+            if score > scores.get(i, (0,))[0]: scores[i] = (score, how)
+
+        for i in self.names.prefix(q):
+            hit(i, 100 if self.keys[i] == q else 80, "exact" if self.keys[i] == q else "prefix")
+        for i in self.spell.prefix(q):
+            hit(i, 70 if q in self.pinyin[i] else 60, "pinyin")
+
+        qgrams = grams(q)
+        counts = {}
+        for g in qgrams:
+            for i in self.postings.get(g, ()):
+                counts[i] = counts.get(i, 0) + 1
+        for i, c in counts.items():
+            if q in self.keys[i]:
+                hit(i, 50, "substring")
+            elif c / len(qgrams) >= MIN_FUZZY:
+                hit(i, 40 * c / len(qgrams), "fuzzy")
+        return scores
+
+    def search(self, query, page=1, size=10):
+        """ 返回 (命中总数, 当前页结果); 结果附带分数与匹配方式 """
+        q = normalize(query)
+        if not q: return 0, []
+        scores = self._scores(q)
+        ranked = sorted(scores, key=lambda i: (-scores[i][0], len(self.keys[i]), self.entries[i]["name"]))
+        start = (page - 1) * size
+        return len(ranked), [dict(self.entries[i], score=scores[i][0], match=scores[i][1])
+                             for i in ranked[start:start + size]]
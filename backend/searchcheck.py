@@ -0,0 +1,86 @@
+"""
+最短路引擎一致性检查: A* / 双向 Dijkstra / 双向 A* / ALT 以及建筑距离表的结果必须与 Dijkstra 相同
+    python backend/searchcheck.py                 # 两种出行方式的原始图与各时段加权图
+    python backend/searchcheck.py --pairs 2000
+随机取图中任意两点 (含不连通的点对), 比较距离, 并校验路径首尾正确、沿路径累加的边权等于返回的距离;
+发现不一致时以非零状态码退出
+"""
+import random
+import sys
+import time
+
+from graph import ALGORITHMS
+from settings import finish, open_parser, script_arguments
+
+EPS = 1e-6
+
+
+def close(a, b):
+    return abs(a - b) <= EPS * max(1.0, abs(b))
+
+
+def valid(graph, src, dst, route, dist):
+    """ 不可达时两者都应给出空路径; 可达时路径首尾正确且长度与距离一致 """
+    if dist == sys.maxsize: return not route
+    return bool(route) and route[0] == src and route[-1] == dst and close(graph.path_length(route), dist)
+
+
+def check_graph(name, graph, pairs, timings):
+    bad = 0
+    for src, dst in pairs:
+        ref_route, ref = graph.route(src, dst, "dijkstra")
+        for algorithm in ALGORITHMS:
+            start = time.perf_counter()
+            route, dist = graph.route(src, dst, algorithm)
+            timings[algorithm] = timings.get(algorithm, 0.0) + time.perf_counter() - start
+            ok = (dist == ref if ref == sys.maxsize else close(dist, ref)) and valid(graph, src, dst, route, dist)
+            if not ok:
+                bad += 1
+                print(f"  {name} {algorithm} {src}->{dst}: {dist} != {ref}")
+    return bad
+
+
+def check_table(name, graph, table, count, rng):
+    """ 距离表查表 (距离 + 沿前驱还原的路径) 与 Dijkstra 比较 """
+    bad = 0
+    nodes = list(table.nodes)
+    for _ in range(count):
+        src, dst = rng.choice(nodes), rng.choice(nodes)
+        route, dist = table.lookup(src, dst)
+        _, ref = graph.route(src, dst, "dijkstra")
+        if ref == sys.maxsize: ok = not route and dist == float("inf")
+        else: ok = close(dist, ref) and valid(graph, src, dst, route, dist)
+        if not ok:
+            bad += 1
+            print(f"  {name} table {src}->{dst}: {dist} != {ref}")
+    return bad
+
+
+def main():
+    ap = script_arguments(__doc__)
+    ap.add_argument("--pairs", type=int, default=300, help="每张图的随机点对数")
+    args = ap.parse_args()
+
+    parser = open_parser(traffic=True, cache_size=0)
+    rng = random.Random(args.seed)
+
+    graphs = [(f"type{tp}", g) for tp, g in parser.graphs.items()]
+    graphs += [(f"type{tp}/{slot}", g) for (tp, slot), g in parser.slot_graphs.items()]
+    bad, timings, checked = 0, {}, 0
+    for name, graph in graphs:
+        n = len(graph)
+        if not n: continue
+        pairs = [(rng.randrange(n), rng.randrange(n)) for _ in range(args.pairs)]
+        bad += check_graph(name, graph, pairs, timings)
+        checked += len(pairs)
+    for tp, table in parser.tables.items():
+        bad += check_table(f"type{tp}", parser.graphs[tp], table, args.pairs, rng)
+
+    print(f"graphs={len(graphs)} pairs={checked} landmarks={[g.landmark_count for g in parser.graphs.values()]}")
+    for algorithm in ALGORITHMS:
+        print(f"{algorithm:<10} {timings.get(algorithm, 0.0) * 1000 / max(checked, 1):.3f} ms/query")
+    finish(bad, "mismatches")
+
+
+if __name__ == "__main__":
+    main()
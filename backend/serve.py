@@ -0,0 +1,107 @@
+"""
+多进程部署入口
+主进程先生成或校验快照再 fork 出多个 worker, worker 共享同一个监听 socket, 各自在后台映射快照, 加载期间返回 503;
+快照以 mmap 映射, 各 worker 的路网数组共享同一份页缓存
+--preload 时主进程先加载完路网再 fork, 路网以写时复制方式被所有 worker 共享, 但加载期间不接受连接
+kill -HUP 主进程: 主进程先更新快照 (地图文件有变化时), 再通知各 worker 在后台重新加载并热替换
+用法: python backend/serve.py [--workers N] [--host 127.0.0.1] [--port 5000] [--preload]
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+
+from werkzeug.serving import make_server
+
+# worker 数量, 默认等于 CPU 核数
+DEFAULT_WORKERS = int(os.environ.get("NAV_WORKERS", os.cpu_count() or 1))
+
+
+def run_worker(app, host, port, fd):
+    # 每个 worker 内部再开线程处理请求, 路由核心是可重入的
+    server = make_server(host, port, app, threaded=True, fd=fd)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    os._exit(0)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="校园导航后端 (多进程)")
+    ap.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=5000)
+    ap.add_argument("--preload", action="store_true", help="fork 之前加载路网 (写时复制共享)")
+    args = ap.parse_args()
+
+    # 由这里决定何时开始加载
+    os.environ["NAV_DEFER_LOAD"] = "1"
+    # 各 worker 的批量计算进程池按 worker 数均分 CPU (见 app.py 的 BATCH_WORKERS)
+    multi = args.workers > 1 and hasattr(os, "fork")
+    os.environ["NAV_HTTP_WORKERS"] = str(args.workers if multi else 1)
+    from app import app, LOADER, prepare_snapshot
+
+    if not multi:
+        # 不支持 fork 的平台 (Windows) 退化为单进程多线程
+        LOADER.start()
+        app.run(host=args.host, port=args.port, threaded=True, use_reloader=False)
+        return
+    if args.preload:
+        LOADER.start()
+        if not LOADER.wait(): sys.exit(f"graph failed to load: {LOADER.error}")
+    else:
+        # 快照只由主进程写一次, worker 不会各自重复解析地图
+        prepare_snapshot()
+        gc.collect()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(128)
+    sock.set_inheritable(True)
+
+    # 冻结已有对象, 避免 worker 中的 GC 触碰共享页导致写时复制
+    gc.freeze()
+
+    children = []
+    for _ in range(args.workers):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            if not args.preload: LOADER.start()
+            run_worker(app, args.host, args.port, sock.fileno())
+        children.append(pid)
+    print(f">>> {args.workers} workers serving on http://{args.host}:{args.port} (pids {children})")
+
+    def shutdown(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        sys.exit(0)
+
+    def reload(signum, frame):
+        try:
+            prepare_snapshot()
+        except Exception as e:
+            print(f"Warning: failed to prepare snapshot: {e}") # worker 加载时会再报告错误并保留旧路网
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGHUP)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    if hasattr(signal, "SIGHUP"): signal.signal(signal.SIGHUP, reload)
+    while children:
+        pid, _ = os.wait()
+        if pid in children: children.remove(pid)
+
+
+if __name__ == "__main__":
+    main()
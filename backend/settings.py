@@ -0,0 +1,46 @@
+"""
+路网加载与预处理配置, app.py / snapshot.py / loadtest.py 等入口共用;
+快照中保存的预处理结果 (ALT 地标、建筑距离表) 由这里决定, 各入口写出的快照才能互相复用
+"""
+import argparse
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+OSM_FILE = os.path.join(BASE_DIR, 'map_test.osm')
+# 上课时间表、拥堵时段及分时段倍率
+TRAFFIC_FILE = os.path.join(BASE_DIR, 'traffic.json')
+
+# ALT 地标数量 (0 = 不做预处理), 结果随快照一起保存
+LANDMARK_COUNT = 8
+# 预计算建筑之间的最短路表, 建筑到建筑的查询直接查表
+BUILDING_TABLE = True
+
+# OSMParser 的预处理参数
+PREPROCESS = {"landmarks": LANDMARK_COUNT, "building_table": BUILDING_TABLE}
+
+
+def open_parser(traffic=False, **options):
+    """
+    按部署方式打开路网, 供压测与检查脚本使用: 映射 app.py 的快照 (缺失或过期时重新生成);
+    预处理参数必须与 app.py 相同, 否则快照校验不通过, 脚本会用自己的参数改写部署快照.
+    traffic=True 时加载分时段路况 (traffic.json 不存在则忽略), options 原样传给 OSMParser
+    """
+    from parser import OSMParser
+    from traffic import TrafficModel
+    import snapshot
+    if traffic: options["traffic"] = TrafficModel.load(TRAFFIC_FILE) if os.path.exists(TRAFFIC_FILE) else None
+    return OSMParser(OSM_FILE, snapshot_path=snapshot.default_path(OSM_FILE), **options, **PREPROCESS)
+
+
+def script_arguments(doc):
+    """ 检查脚本的参数解析器: 以模块文档为说明, 带公共的 --seed """
+    ap = argparse.ArgumentParser(description=doc, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--seed", type=int, default=0)
+    return ap
+
+
+def finish(failures, label="failures"):
+    """ 输出失败数并以它决定退出状态 """
+    print(f"{label} {failures}")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,140 @@
+"""
+预编译路网快照
+文件布局:
+MAGIC (8B) | 版本号 u32 | 源 OSM 文件 sha256 (32B) | 元数据长度 u64 | 元数据 JSON | 对齐填充 | 各数组原始字节
+元数据中记录边界、建筑表、建筑轮廓以及每组数组 (路网、ALT 地标、建筑间距离表) 中各数组的 (typecode, 偏移, 长度);
+读取时整体 mmap, 数组直接 cast 成 memoryview, 不做拷贝
+"""
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+
+MAGIC = b"SHUNAVG\0"
+FORMAT_VERSION = 4
+_HEADER = struct.Struct("<8sI32sQ")
+GRAPH_FIELDS = ("ids", "lat", "lon", "offsets", "targets", "weights", "landmark_dist")
+TABLE_FIELDS = ("nodes", "dist", "tree_offsets", "tree_nodes", "tree_pred")
+
+
+def file_digest(path):
+    """ 源 OSM 文件的 sha256, 快照以此判断是否过期 """
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.digest()
+
+
+def default_path(datapath):
+    return datapath + ".snapshot"
+
+
+def write(path, digest, bounds, arrays, buildings, polygons):
+    """
+    arrays   : {分组名: {字段名: array/memoryview}}, 如 {"graph1": {"ids": ..., ...}}
+    buildings: [(名称, 步行接入点 (id, lat, lon), 骑行接入点 (id, lat, lon))]
+    先在同一目录下写唯一命名的临时文件再原子替换, 并发写入的进程互不干扰, 读者也不会读到写了一半的快照
+    """
+    blobs, layout, offset = [], {}, 0
+    for group, fields in arrays.items():
+        for field, values in fields.items():
+            # 可能是 array, 也可能是上一次快照映射出来的 memoryview
+            typecode = values.format if isinstance(values, memoryview) else values.typecode
+            buf = values.tobytes()
+            layout.setdefault(group, {})[field] = (typecode, offset, len(values))
+            blobs.append(buf)
+            offset += len(buf)
+            pad = -offset % 8
+            blobs.append(b"\0" * pad)
+            offset += pad
+
+    meta = json.dumps({
+        "bounds": bounds,
+        "buildings": buildings,
+        "polygons": polygons,
+        "layout": layout,
+    }, ensure_ascii=False).encode("utf-8")
+    data_start = _HEADER.size + len(meta)
+    data_start += -data_start % 8
+
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=os.path.basename(path) + ".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, digest, len(meta)))
+            f.write(meta)
+            f.write(b"\0" * (data_start - _HEADER.size - len(meta)))
+            for blob in blobs:
+                f.write(blob)
+        os.chmod(tmp, 0o644) # mkstemp 创建的文件只有属主可读
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def read(path, digest):
+    """
+    打开并映射快照; 文件不存在、版本不符、源文件哈希不符或内容截断/损坏时返回 None (调用方重新解析)
+    返回 dict: bounds / buildings / polygons / arrays ({分组名: {字段名: memoryview}})
+    """
+    if not os.path.exists(path): return None
+    with open(path, "rb") as f:
+        try:
+            # ACCESS_COPY: 私有写时复制映射, 运行时修改边权不会写回文件
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        except ValueError:
+            return None # 空文件
+    try:
+        data = _decode(mm, digest)
+    except (struct.error, ValueError, TypeError, KeyError, IndexError, AttributeError):
+        data = None # 元数据或数组布局损坏 (JSON / UTF-8 解码错误也是 ValueError)
+    # 失败时 _decode 中的 memoryview 已随栈帧释放, 可以关闭映射
+    if data is None: mm.close()
+    return data
+
+
+def _decode(mm, digest):
+    if len(mm) < _HEADER.size: return None
+    magic, version, file_digest_, meta_len = _HEADER.unpack_from(mm, 0)
+    if magic != MAGIC or version != FORMAT_VERSION or file_digest_ != digest: return None
+    if _HEADER.size + meta_len > len(mm): return None
+
+    meta = json.loads(bytes(mm[_HEADER.size:_HEADER.size + meta_len]).decode("utf-8"))
+    data_start = _HEADER.size + meta_len
+    data_start += -data_start % 8
+
+    # 先校验全部数组都在文件范围内, 截断的快照不产生任何视图
+    spans = []
+    for group, fields in meta["layout"].items():
+        for field, (typecode, offset, count) in fields.items():
+            start = data_start + offset
+            end = start + count * array(typecode).itemsize
+            if offset < 0 or count < 0 or end > len(mm): return None
+            spans.append((group, field, typecode, start, end))
+
+    view = memoryview(mm)
+    arrays = {}
+    for group, field, typecode, start, end in spans:
+        arrays.setdefault(group, {})[field] = view[start:end].cast(typecode)
+    return {
+        "bounds": meta["bounds"],
+        "buildings": meta["buildings"],
+        "polygons": meta["polygons"],
+        "arrays": arrays,
+    }
+
+
+if __name__ == "__main__":
+    # 编译快照: python snapshot.py map_test.osm [输出路径]; 预处理参数与 app.py 相同 (settings.py)
+    from parser import OSMParser
+    from settings import OSM_FILE, PREPROCESS
+    src = sys.argv[1] if len(sys.argv) > 1 else OSM_FILE
+    dst = sys.argv[2] if len(sys.argv) > 2 else default_path(src)
+    if os.path.exists(dst): os.remove(dst)
+    OSMParser(src, snapshot_path=dst, **PREPROCESS)
+    print(f"Snapshot written to {dst}")
@@ -0,0 +1,143 @@
+import heapq
+import math
+
+EARTH_RADIUS = 6371.393 * 1000 # 地球半径（米）
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """ 球面大圆距离 (米) """
+    lon_1, lat_1, lon_2, lat_2 = map(math.radians, [lon1, lat1, lon2, lat2])
+    dlon = lon_2 - lon_1
+    dlat = lat_2 - lat_1
+    a = math.sin(dlat / 2) ** 2 + math.cos(lat_1) * math.cos(lat_2) * math.sin(dlon / 2) ** 2
+    return 2 * math.asin(math.sqrt(a)) * EARTH_RADIUS
+
+
+class GridIndex():
+    """
+    均匀网格空间索引
+    将经纬度按等距圆柱投影到平面 (米), 按 cell 边长分桶;
+    最近邻查询从查询点所在格子向外逐圈扩展, 期望 O(1)
+    """
+    def __init__(self, lats, lons, cell=50.0):
+        self.cell = cell
+        self.lat0 = (min(lats) + max(lats)) / 2 if lats else 0.0
+        self.kx = math.radians(1) * EARTH_RADIUS * math.cos(math.radians(self.lat0))
+        self.ky = math.radians(1) * EARTH_RADIUS
+        self.xs, self.ys = [], []
+        self.cells = {}
+        for i, (lat, lon) in enumerate(zip(lats, lons)):
+            x, y = self.project(lat, lon)
+            self.xs.append(x); self.ys.append(y)
+            self.cells.setdefault(self.cell_of(x, y), []).append(i)
+        if self.cells:
+            cxs = [c[0] for c in self.cells]; cys = [c[1] for c in self.cells]
+            self.cell_bounds = (min(cxs), max(cxs), min(cys), max(cys))
+
+    def __len__(self):
+        return len(self.xs)
+
+    def project(self, lat, lon):
+        return lon * self.kx, lat * self.ky
+
+    def cell_of(self, x, y):
+        return int(math.floor(x / self.cell)), int(math.floor(y / self.cell))
+
+    def _ring(self, cx, cy, r):
+        if r == 0:
+            yield cx, cy
+            return
+        for dx in range(-r, r + 1):
+            yield cx + dx, cy - r
+            yield cx + dx, cy + r
+        for dy in range(-r + 1, r):
+            yield cx - r, cy + dy
+            yield cx + r, cy + dy
+
+    def k_nearest(self, lat, lon, k=1):
+        """ 返回按投影距离升序的 [(距离(米), 下标), ...], 最多 k 个 """
+        if not self.cells or k <= 0: return []
+        x, y = self.project(lat, lon)
+        cx, cy = self.cell_of(x, y)
+        minx, maxx, miny, maxy = self.cell_bounds
+        rmax = max(abs(cx - minx), abs(maxx - cx), abs(cy - miny), abs(maxy - cy))
+
+        best = [] # 大顶堆 (-d2, i)
+        for r in range(rmax + 1):
+            for c in self._ring(cx, cy, r):
+                for i in self.cells.get(c, ()):
+                    d2 = (self.xs[i] - x) ** 2 + (self.ys[i] - y) ** 2
+                    if len(best) < k: heapq.heappush(best, (-d2, i))
+                    elif d2 < -best[0][0]: heapq.heapreplace(best, (-d2, i))
+            # 第 r 圈之外的点距离至少为 r * cell
+            if len(best) == k and -best[0][0] <= (r * self.cell) ** 2: break
+        return sorted((math.sqrt(-d2), i) for d2, i in best)
+
+    def nearest(self, lat, lon):
+        """ 返回 (下标, 投影距离); 索引为空时返回 (None, None) """
+        res = self.k_nearest(lat, lon, 1)
+        if not res: return None, None
+        return res[0][1], res[0][0]
+
+    def within(self, lat, lon, radius):
+        """ 返回投影距离不超过 radius (米) 的全部下标 """
+        if not self.cells: return []
+        x, y = self.project(lat, lon)
+        r = int(math.ceil(radius / self.cell))
+        cx, cy = self.cell_of(x, y)
+        out = []
+        for gx in range(cx - r, cx + r + 1):
+            for gy in range(cy - r, cy + r + 1):
+                for i in self.cells.get((gx, gy), ()):
+                    if (self.xs[i] - x) ** 2 + (self.ys[i] - y) ** 2 <= radius * radius: out.append(i)
+        return out
+
+
+def simplify(points, tolerance):
+    """
+    Douglas-Peucker 折线简化, points 为 [(lat, lon), ...], tolerance 为允许偏差 (米)
+    在以首点纬度为基准的等距圆柱投影平面上计算, 首尾点始终保留
+    """
+    if len(points) < 3 or tolerance <= 0: return list(points)
+    kx = math.radians(1) * EARTH_RADIUS * math.cos(math.radians(points[0][0]))
+    ky = math.radians(1) * EARTH_RADIUS
+    xy = [(p[1] * kx, p[0] * ky) for p in points]
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    tol2 = tolerance * tolerance
+    while stack:
+        i, j = stack.pop()
+        (x1, y1), (x2, y2) = xy[i], xy[j]
+        dx, dy = x2 - x1, y2 - y1
+        seg2 = dx * dx + dy * dy
+        best, best_k = -1.0, -1
+        for k in range(i + 1, j):
+            px, py = xy[k][0] - x1, xy[k][1] - y1
+            if seg2 == 0:
+                d2 = px * px + py * py
+            else:
+                t = max(0.0, min(1.0, (px * dx + py * dy) / seg2))
+                ex, ey = px - t * dx, py - t * dy
+                d2 = ex * ex + ey * ey
+            if d2 > best: best, best_k = d2, k
+        if best > tol2:
+            keep[best_k] = True
+            stack.append((i, best_k)); stack.append((best_k, j))
+    return [p for p, k in zip(points, keep) if k]
+
+
+def convex_hull(points):
+    """ Andrew 单调链凸包, points 为 [(lat, lon), ...], 返回逆时针顶点 (首尾闭合); 不足 3 点时原样返回 """
+    pts = sorted(set(map(tuple, points)))
+    if len(pts) < 3: return [list(p) for p in pts]
+    cross = lambda o, a, b: (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+    lower, upper = [], []
+    for p in pts:
+        while len(lower) >= 2 and cross(lower[-2], lower[-1], p) <= 0: lower.pop()
+        lower.append(p)
+    for p in reversed(pts):
+        while len(upper) >= 2 and cross(upper[-2], upper[-1], p) <= 0: upper.pop()
+        upper.append(p)
+    hull = lower[:-1] + upper[:-1]
+    return [list(p) for p in hull + hull[:1]]
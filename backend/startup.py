@@ -33,6 +33,8 @@ MAP_FILE = os.path.join(PROJECT_ROOT, MAP_FILE_NAME) # map_1.osm 在项目根目
 
 # Flask 默认运行地址和端口
 FLASK_URL = "http://127.0.0.1:5000"
+# 等待路网加载完成的最长时间 (秒)
+READY_TIMEOUT = 300
 
 # 依赖库列表
 REQUIRED_PACKAGES = ['flask', 'requests', 'lxml'] 
@@ -114,25 +116,45 @@ def start_backend():
     return True
 
 def wait_for_backend():
-    """ 尝试连接后端，直到服务启动 """
-    max_retries = 30 # 最多等待 30 秒
+    """ 先等待服务可连接 (/api/health), 再等待路网加载完成 (/api/ready), 期间打印加载阶段 """
+    max_retries = 30 # 最多等待 30 秒建立连接
     print(">>> 正在等待后端服务启动...")
     for i in range(max_retries):
         try:
-            # 尝试访问 Flask 端点
-            response = requests.get(f"{FLASK_URL}/api/locations", timeout=5) 
-            # 只要能收到响应，就认为服务已启动
-            if response.status_code == 200 or response.status_code == 404: 
-                print(f">>> 后端服务已启动 ({FLASK_URL})!")
-                return True
+            requests.get(f"{FLASK_URL}/api/health", timeout=5)
+            break
         except requests.exceptions.ConnectionError:
             print(f"   [尝试 {i+1}/{max_retries}] 仍在等待...")
             time.sleep(1)
         except Exception as e:
             print(f"连接检查中发生意外错误: {e}")
-            break
-            
-    print("❌ 错误: 无法连接到后端服务。启动失败。")
+            return False
+    else:
+        print("❌ 错误: 无法连接到后端服务。启动失败。")
+        return False
+
+    print(">>> 后端已启动，正在加载地图数据...")
+    deadline = time.time() + READY_TIMEOUT
+    last_stage = None
+    while time.time() < deadline:
+        try:
+            response = requests.get(f"{FLASK_URL}/api/ready", timeout=5)
+            status = response.json()
+        except Exception as e:
+            print(f"就绪检查中发生意外错误: {e}")
+            return False
+        if response.status_code == 200:
+            print(f">>> 后端服务已就绪 ({FLASK_URL})!")
+            return True
+        if status.get("error") and not status.get("loading"):
+            print(f"❌ 错误: 地图加载失败: {status['error']}")
+            return False
+        if status.get("stage") and status["stage"] != last_stage:
+            last_stage = status["stage"]
+            print(f"   加载阶段: {last_stage}")
+        time.sleep(float(response.headers.get("Retry-After", 1)))
+
+    print("❌ 错误: 等待地图加载超时。启动失败。")
     return False
 
 def open_frontend():
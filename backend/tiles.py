@@ -0,0 +1,466 @@
+"""
+分块路网: 把较大区域 (如包含各校区的上海市 OSM 提取) 按经纬度切成固定大小的瓦片, 服务端按需加载、超过内存上限时淘汰
+    python backend/tiles.py shanghai.osm [输出目录] [--size 0.01]   # 离线切块, 输出目录默认为 <源文件>.tiles
+    NAV_TILES=输出目录 python backend/app.py                         # 以分块路网启动
+目录布局:
+    manifest.json  : 源文件 sha256、瓦片边长 (度)、总边界、瓦片列表、建筑表与建筑轮廓
+    {ty}_{tx}.tile : 瓦片内节点的步行/骑行邻接表, 文件格式与 snapshot.py 相同 (mmap 读取)
+边存放在起点所在的瓦片中, 终点以 OSM id 表示并附带其所在瓦片的编号, 搜索扩展到相邻瓦片时才加载它;
+启动时只读取 manifest, 路网部分的常驻内存由瓦片缓存上限决定, 与区域大小无关 (离线切块仍需一次载入整个源文件);
+建筑表与建筑轮廓不分块: 随 manifest 一次载入并常驻, 内存随建筑数量 (而非路网规模) 增长,
+因为 /api/locations 与搜索索引在启动时就要用到全部建筑
+"""
+from array import array
+from collections import OrderedDict
+import argparse
+import heapq
+import json
+import math
+import os
+import sys
+import threading
+from time import perf_counter
+
+from parser import OSMParser, node, timer
+from graph import HEURISTIC_SCALE
+from spatial import EARTH_RADIUS, GridIndex, haversine
+from route_cache import RouteCache
+from traffic import NORMAL
+from metrics import REGISTRY, observe_search
+import snapshot
+
+MANIFEST = "manifest.json"
+MANIFEST_VERSION = 1
+DEFAULT_TILE_SIZE = 0.01 # 度, 约 1.1 km x 0.95 km
+MIN_TILE_SIZE = 0.001
+DEFAULT_CACHE_MB = 256
+NODE_OVERHEAD = 200 # 每个节点在 id 字典与网格索引中的额外开销 (字节), 用于估算瓦片内存
+SNAP_MAX_DIST = 2000.0 # 吸附最近节点的最远距离 (米), 更远的瓦片不再查看
+TILE_FIELDS = ("ids", "lat", "lon", "offsets", "targets", "weights", "tiles")
+INF = float("inf")
+
+# 瓦片编号 (ty, tx) 打包成一个整数存入数组; MIN_TILE_SIZE 下 |tx| < 2^20
+_KEY_BASE = 1 << 20
+
+
+def tile_key(lat, lon, size):
+    return math.floor(lat / size), math.floor(lon / size)
+
+
+def pack(key):
+    return (key[0] + _KEY_BASE) * (2 * _KEY_BASE) + key[1] + _KEY_BASE
+
+
+def unpack(code):
+    ty, tx = divmod(code, 2 * _KEY_BASE)
+    return ty - _KEY_BASE, tx - _KEY_BASE
+
+
+def tile_name(key):
+    return f"{key[0]}_{key[1]}.tile"
+
+
+def _tile_arrays(graph, codes, members):
+    """ 瓦片内节点 (图下标, 升序) 的邻接表: 终点换成 OSM id, 并记录终点所在瓦片 """
+    out = {f: array(t) for f, t in zip(TILE_FIELDS, "qddqqdq")}
+    out["offsets"].append(0)
+    for i in members:
+        out["ids"].append(graph.ids[i]); out["lat"].append(graph.lat[i]); out["lon"].append(graph.lon[i])
+        for k in range(graph.offsets[i], graph.offsets[i + 1]):
+            j = graph.targets[k]
+            out["targets"].append(graph.ids[j]); out["weights"].append(graph.weights[k]); out["tiles"].append(codes[j])
+        out["offsets"].append(len(out["targets"]))
+    return out
+
+
+@timer
+def build(datapath, out_dir, size=DEFAULT_TILE_SIZE):
+    """ 解析源文件并写出全部瓦片与 manifest; 目录中不再使用的旧瓦片会被删除 """
+    if size < MIN_TILE_SIZE: raise ValueError(f"tile size must be >= {MIN_TILE_SIZE}")
+    parser = OSMParser(datapath, cache_size=0)
+    digest = snapshot.file_digest(datapath)
+    os.makedirs(out_dir, exist_ok=True)
+
+    codes, members = {}, {}
+    for tp, graph in parser.graphs.items():
+        codes[tp] = array('q', (pack(tile_key(lat, lon, size)) for lat, lon in zip(graph.lat, graph.lon)))
+        for i, code in enumerate(codes[tp]):
+            members.setdefault(code, {1: [], 2: []})[tp].append(i)
+
+    tiles = {}
+    for code, per_type in sorted(members.items()):
+        key = unpack(code)
+        arrays = {f"graph{tp}": _tile_arrays(parser.graphs[tp], codes[tp], per_type[tp]) for tp in (1, 2)}
+        bounds = (key[0] * size, (key[0] + 1) * size, key[1] * size, (key[1] + 1) * size)
+        snapshot.write(os.path.join(out_dir, tile_name(key)), digest, bounds, arrays, [], {})
+        tiles[tile_name(key)] = {"walk": len(per_type[1]), "bike": len(per_type[2])}
+    for name in os.listdir(out_dir):
+        if name.endswith(".tile") and name not in tiles: os.remove(os.path.join(out_dir, name))
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "source": os.path.basename(datapath),
+        "digest": digest.hex(),
+        "size": size,
+        "bounds": (parser.minlat, parser.maxlat, parser.minlon, parser.maxlon),
+        "tiles": tiles,
+        "buildings": [(name, (wid, wn.lat, wn.lon) if wn else None, (bid, bn.lat, bn.lon) if bn else None)
+                      for name, (wid, wn), (bid, bn) in parser.building_info_list],
+        "polygons": parser.building_polygons,
+    }
+    tmp = os.path.join(out_dir, MANIFEST + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp, os.path.join(out_dir, MANIFEST))
+    return manifest
+
+
+class TileGraph():
+    """ 一个瓦片内某种出行方式的邻接表; targets 为终点 OSM id, tiles[k] 为第 k 条边终点所在瓦片的编号 """
+    def __init__(self, ids, lat, lon, offsets, targets, weights, tiles):
+        self.ids = ids
+        self.lat = lat
+        self.lon = lon
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+        self.tiles = tiles
+        self.index = {nid: i for i, nid in enumerate(ids)}
+        self.spatial = GridIndex(lat, lon)
+        self.mult = {} # 时段 -> {下标: 拥堵区域倍率}, 首次用到时计算
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class TileStore():
+    """ 瓦片的 LRU 缓存, 按估算内存 (文件大小 + 每节点开销) 淘汰, 至少保留最近用到的一个瓦片 """
+    def __init__(self, directory, manifest, capacity_mb=DEFAULT_CACHE_MB):
+        self.directory = directory
+        self.digest = bytes.fromhex(manifest["digest"])
+        self.available = {pack(tuple(map(int, name[:-5].split("_")))) for name in manifest["tiles"]}
+        self.capacity = capacity_mb * 2 ** 20
+        self.lock = threading.Lock()
+        self.tiles = OrderedDict() # 编号 -> ({出行方式: TileGraph}, 估算字节数)
+        self.bytes = 0
+        self.hits = self.loads = self.evictions = 0
+
+    def get(self, code):
+        """ 返回 {出行方式: TileGraph}; 该位置没有瓦片时返回 None """
+        with self.lock:
+            entry = self.tiles.get(code)
+            if entry is not None:
+                self.tiles.move_to_end(code)
+                self.hits += 1
+                return entry[0]
+            if code not in self.available: return None
+            entry = self._load(code)
+            if entry is None: return None
+            self.tiles[code] = entry
+            self.bytes += entry[1]
+            self.loads += 1
+            while self.bytes > self.capacity and len(self.tiles) > 1:
+                _, (_, nbytes) = self.tiles.popitem(last=False)
+                self.bytes -= nbytes
+                self.evictions += 1
+        return entry[0]
+
+    @timer
+    def _load(self, code):
+        path = os.path.join(self.directory, tile_name(unpack(code)))
+        data = snapshot.read(path, self.digest)
+        if data is None:
+            # 缺失或与 manifest 不是同一次切块的产物: 视为空白区域
+            print(f"Warning: tile {path} is missing or stale, run tiles.py again")
+            self.available.discard(code)
+            return None
+        graphs = {tp: TileGraph(**data["arrays"][f"graph{tp}"]) for tp in (1, 2)}
+        nbytes = os.path.getsize(path) + NODE_OVERHEAD * sum(len(g) for g in graphs.values())
+        return graphs, nbytes
+
+    def stats(self):
+        with self.lock:
+            return {"tiles": len(self.available), "loaded": len(self.tiles),
+                    "bytes": self.bytes, "capacity": self.capacity,
+                    "hits": self.hits, "loads": self.loads, "evictions": self.evictions}
+
+
+class TiledParser():
+    """
+    分块路网上的查询, 接口与 OSMParser 中 app.py 用到的部分一致
+    (Timed_path_pos / Shortest_path_pos / one_to_many / distance_matrix / isochrone / nearest_node)
+    跨瓦片的点对点查询一律用 A*, 与单图上的各算法结果相同; 不支持 ALT 地标、建筑距离表与在线封路
+    瓦片缓存只限制路网的内存, 建筑表与轮廓始终全部常驻
+    """
+    def __init__(self, directory, capacity_mb=DEFAULT_CACHE_MB, cache_size=4096, traffic=None):
+        print(f"Loading tile manifest from {directory}...")
+        with open(os.path.join(directory, MANIFEST), encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != MANIFEST_VERSION: raise ValueError(f"unsupported tile manifest in {directory}")
+        self.size = manifest["size"]
+        self.minlat, self.maxlat, self.minlon, self.maxlon = manifest["bounds"]
+        # 瓦片在纬度/经度方向的最短边长 (米), 用于判断吸附时是否还需查看外圈瓦片
+        lat_max = max(abs(self.minlat), abs(self.maxlat))
+        self.tile_metres = math.radians(self.size) * EARTH_RADIUS * math.cos(math.radians(lat_max))
+        self.store = TileStore(directory, manifest, capacity_mb)
+        self.traffic = traffic
+        self.route_cache = RouteCache(cache_size)
+
+        def access(entry):
+            if entry is None: return (None, None)
+            nid, lat, lon = entry
+            return (nid, node(nid, lat, lon))
+
+        self.building_info_list = [(name, access(w), access(b)) for name, w, b in manifest["buildings"]]
+        self.building_name_list = [name for name, _, _ in self.building_info_list]
+        self.building_polygons = manifest["polygons"]
+
+        # 拥堵区域: (出行方式, 时段) -> [(倍率, lat, lon, 半径)], 瓦片加载后首次用到该时段时换算成节点倍率
+        self.zones = {}
+        for buildings, radius, per_slot in (traffic.zones if traffic else ()):
+            points = traffic.zone_points(self, buildings)
+            for slot, mults in per_slot.items():
+                for tp, m in mults.items():
+                    if m > 1.0: self.zones.setdefault((tp, slot), []).extend((m, lat, lon, radius) for lat, lon in points)
+        print(f"Tile manifest loaded: {len(self.store.available)} tiles, {len(self.building_info_list)} buildings.")
+
+    def calculate_distance(self, lat1, lon1, lat2, lon2):
+        return haversine(lat1, lon1, lat2, lon2)
+
+    def check_bounds(self, pos):
+        return (self.minlat <= pos[0] <= self.maxlat) and (self.minlon <= pos[1] <= self.maxlon)
+
+    def code_of(self, lat, lon):
+        return pack(tile_key(lat, lon, self.size))
+
+    @timer
+    def nearest_node(self, type, lat, lon):
+        """ 从查询点所在瓦片逐圈向外查找, 外圈瓦片不可能更近或超出 SNAP_MAX_DIST 时停止 """
+        ty, tx = tile_key(lat, lon, self.size)
+        best = (None, None, sys.maxsize)
+        r = 0
+        # 第 r 圈瓦片与查询点的距离至少为 (r - 1) 个瓦片边长
+        while (r - 1) * self.tile_metres < min(best[2], SNAP_MAX_DIST):
+            for dy in range(-r, r + 1):
+                for dx in range(-r, r + 1):
+                    if max(abs(dy), abs(dx)) != r: continue
+                    tile = self.store.get(pack((ty + dy, tx + dx)))
+                    if tile is None: continue
+                    tg = tile[type]
+                    i, _ = tg.spatial.nearest(lat, lon)
+                    if i is None: continue
+                    d = haversine(tg.lat[i], tg.lon[i], lat, lon)
+                    if d < best[2]: best = (tg.ids[i], node(tg.ids[i], tg.lat[i], tg.lon[i]), d)
+            r += 1
+        return best
+
+    def _mult(self, tg, type, slot):
+        """ 瓦片内节点在该时段的拥堵区域倍率 """
+        mult = tg.mult.get(slot)
+        if mult is None:
+            mult = {}
+            if len(tg):
+                lo_lat, hi_lat = min(tg.lat), max(tg.lat)
+                lo_lon, hi_lon = min(tg.lon), max(tg.lon)
+                for m, lat, lon, radius in self.zones.get((type, slot), ()):
+                    # 粗筛: 区域中心到瓦片节点外包框的距离超过半径的跳过
+                    dlat = max(lo_lat - lat, lat - hi_lat, 0.0)
+                    dlon = max(lo_lon - lon, lon - hi_lon, 0.0)
+                    if haversine(lat, lon, lat + dlat, lon) > radius: continue
+                    if haversine(lat, lon, lat, lon + dlon) > radius: continue
+                    for i in tg.spatial.within(lat, lon, radius):
+                        if m > mult.get(i, 1.0): mult[i] = m
+            tg.mult[slot] = mult
+        return mult
+
+    def _search(self, type, slot, src, dst=None, targets=None, max_dist=INF, stats=None):
+        """
+        跨瓦片的 Dijkstra / A*; src、dst 为吸附节点 node
+        dst 非空时以到终点的球面距离为启发函数, 到达即停止; 否则为单源搜索, targets 全部确定或代价超过 max_dist 后停止
+        边权 = 长度 x max(时段默认倍率, 两端点的拥堵区域倍率), 与 TrafficModel.build_weights 相同
+        返回 (final {id: 加权代价}, pre {id: 前驱 id}, length {id: 实际距离}, coord {id: (lat, lon)})
+        本次搜索用到的瓦片由 graphs 持有, 搜索期间即使被缓存淘汰也不会重复加载
+        """
+        weighted = slot != NORMAL and self.traffic is not None
+        base = self.traffic.multiplier(slot, type) if weighted else 1.0
+        graphs = {}
+        def graph(code):
+            if code not in graphs:
+                tile = self.store.get(code)
+                graphs[code] = tile[type] if tile is not None else None
+            return graphs[code]
+
+        sg = graph(self.code_of(src.lat, src.lon))
+        if sg is None or src.id not in sg.index: return {}, {}, {}, {}
+        if dst is not None:
+            h = lambda lat, lon: haversine(lat, lon, dst.lat, dst.lon) * HEURISTIC_SCALE
+        else:
+            h = lambda lat, lon: 0.0
+        remaining = set(targets) if targets is not None else None
+        goal = dst.id if dst is not None else None
+
+        at = {src.id: (sg, sg.index[src.id])}
+        dist, length, pre, final = {src.id: 0.0}, {src.id: 0.0}, {src.id: -1}, {}
+        heap = [(h(src.lat, src.lon), src.id)]
+        relaxed = 0
+        while heap:
+            _, u = heapq.heappop(heap)
+            if u in final: continue
+            d = dist[u]
+            if d > max_dist: break
+            final[u] = d
+            if u == goal: break
+            if remaining is not None:
+                remaining.discard(u)
+                if not remaining: break
+            tg, i = at[u]
+            lo, hi = tg.offsets[i], tg.offsets[i + 1]
+            relaxed += hi - lo
+            mu = max(base, self._mult(tg, type, slot).get(i, 1.0)) if weighted else 1.0
+            for k in range(lo, hi):
+                v = tg.targets[k]
+                if v in final: continue
+                loc = at.get(v)
+                if loc is None:
+                    vg = graph(tg.tiles[k])
+                    j = vg.index.get(v) if vg is not None else None
+                    if j is None: continue # 相邻瓦片缺失
+                    loc = at[v] = (vg, j)
+                w = tg.weights[k]
+                cost = w * max(mu, self._mult(loc[0], type, slot).get(loc[1], 1.0)) if weighted else w
+                alt = d + cost
+                if alt < dist.get(v, INF):
+                    dist[v] = alt
+                    length[v] = length[u] + w
+                    pre[v] = u
+                    heapq.heappush(heap, (alt + h(loc[0].lat[loc[1]], loc[0].lon[loc[1]]), v))
+
+        if stats is not None:
+            stats["settled"] = len(final)
+            stats["relaxed"] = relaxed
+        coord = {u: (at[u][0].lat[at[u][1]], at[u][0].lon[at[u][1]]) for u in final}
+        return final, {u: pre[u] for u in final}, {u: length[u] for u in final}, coord
+
+    def search(self, type, algorithm, *args, **kwargs):
+        """ 执行一次跨瓦片搜索, 指标开启时记录耗时、确定节点数与松弛边数 """
+        if not REGISTRY.enabled: return self._search(type, *args, **kwargs)
+        stats = {}
+        start = perf_counter()
+        result = self._search(type, *args, stats=stats, **kwargs)
+        observe_search(type, algorithm, perf_counter() - start, stats)
+        return result
+
+    @staticmethod
+    def _unwind(pre, coord, dst):
+        route = []
+        u = dst
+        while u != -1:
+            route.append(coord[u])
+            u = pre[u]
+        route.reverse()
+        return route
+
+    @timer
+    def Shortest_path_pos(self, start_pos, end_pos, type, algorithm="dijkstra"):
+        path, dist, _ = self.Timed_path_pos(start_pos, end_pos, type, NORMAL, algorithm)
+        return path, dist
+
+    @timer
+    def Timed_path_pos(self, start_pos, end_pos, type, slot=NORMAL, algorithm="dijkstra"):
+        """ 返回值与 OSMParser.Timed_path_pos 相同: (坐标路径, 实际距离(米), 加权代价), 失败时距离与代价均为 -1 """
+        if not (self.check_bounds(start_pos) and self.check_bounds(end_pos)): return [], -1, -1
+        sid, snode, sdist = self.nearest_node(type, start_pos[0], start_pos[1])
+        eid, enode, edist = self.nearest_node(type, end_pos[0], end_pos[1])
+        if not snode or not enode: return [], -1, -1
+        snap_mult = self.traffic.multiplier(slot, type) if self.traffic else 1.0
+        if sid == eid:
+            return [start_pos, (snode.lat, snode.lon), end_pos], sdist + edist, (sdist + edist) * snap_mult
+
+        key = type if slot == NORMAL else (type, slot)
+        cached = self.route_cache.get(sid, eid, key)
+        if cached is None:
+            final, pre, length, coord = self.search(type, "astar", slot, snode, dst=enode)
+            if eid in final:
+                cached = (self._unwind(pre, coord, eid), (length[eid], final[eid]))
+            else:
+                cached = ([], None)
+            self.route_cache.put(sid, eid, key, *cached)
+        route, result = cached
+        if result is None: return [], -1, -1
+        dist, cost = result
+        return [start_pos] + route + [end_pos], dist + sdist + edist, cost + (sdist + edist) * snap_mult
+
+    def _snap(self, type, pos):
+        """ (吸附节点 node, 距离); 越界或无法吸附时 node 为 None """
+        if not self.check_bounds(pos): return None, 0.0
+        _, nd, d = self.nearest_node(type, pos[0], pos[1])
+        return nd, d
+
+    @timer
+    def one_to_many(self, start_pos, end_positions, type, slot=NORMAL, with_paths=False):
+        """ 与 OSMParser.one_to_many 相同: 一次单源搜索, 返回 [(坐标路径或 None, 实际距离, 加权代价)] """
+        failed = (None, -1, -1)
+        snode, sdist = self._snap(type, start_pos)
+        if snode is None: return [failed] * len(end_positions)
+        snap_mult = self.traffic.multiplier(slot, type) if self.traffic else 1.0
+        ends = [self._snap(type, pos) for pos in end_positions]
+        final, pre, length, coord = self.search(type, "single_source", slot, snode,
+                                                targets={nd.id for nd, _ in ends if nd is not None})
+        out = []
+        for pos, (nd, edist) in zip(end_positions, ends):
+            if nd is None or nd.id not in final:
+                out.append(failed)
+                continue
+            path = [start_pos] + self._unwind(pre, coord, nd.id) + [pos] if with_paths else None
+            out.append((path, length[nd.id] + sdist + edist, final[nd.id] + (sdist + edist) * snap_mult))
+        return out
+
+    @timer
+    def distance_matrix(self, sources, targets, type, slot=NORMAL, with_lengths=False):
+        """ 与 OSMParser.distance_matrix 相同; 同一吸附节点的起点共用一次单源搜索 """
+        snap_mult = self.traffic.multiplier(slot, type) if self.traffic else 1.0
+        dst_snap = [self._snap(type, p) for p in targets]
+        wanted = {nd.id for nd, _ in dst_snap if nd is not None}
+        matrix, lengths, searched = [], [], {}
+        for pos in sources:
+            snode, sd = self._snap(type, pos)
+            if snode is None:
+                matrix.append([-1] * len(targets))
+                lengths.append([-1] * len(targets))
+                continue
+            if snode.id not in searched:
+                final, _, length, _ = self.search(type, "single_source", slot, snode, targets=wanted)
+                searched[snode.id] = (final, length)
+            dist, length = searched[snode.id]
+            matrix.append([(sd + td) * snap_mult + dist[nd.id] if nd is not None and nd.id in dist else -1
+                           for nd, td in dst_snap])
+            lengths.append([sd + td + length[nd.id] if nd is not None and nd.id in dist else -1
+                            for nd, td in dst_snap])
+        return (lengths, matrix) if with_lengths else matrix
+
+    @timer
+    def isochrone(self, start_pos, type, max_cost, slot=NORMAL):
+        """ 与 OSMParser.isochrone 相同: 返回 (可达建筑 [(名称, 接入点 node, 加权代价)], 可达节点坐标), 越界时为 None """
+        snode, sdist = self._snap(type, start_pos)
+        if snode is None: return None
+        snap_cost = sdist * (self.traffic.multiplier(slot, type) if self.traffic else 1.0)
+        if snap_cost > max_cost: return [], []
+        final, _, _, coord = self.search(type, "isochrone", slot, snode, max_dist=max_cost - snap_cost)
+        reached = [(info[0], info[type][1], final[info[type][0]] + snap_cost)
+                   for info in self.building_info_list if info[type][1] and info[type][0] in final]
+        return reached, list(coord.values())
+
+
+def main():
+    ap = argparse.ArgumentParser(description="把 OSM 地图切成按需加载的路网瓦片")
+    ap.add_argument("source", help="OSM 文件")
+    ap.add_argument("out", nargs="?", help="输出目录, 默认为 <源文件>.tiles")
+    ap.add_argument("--size", type=float, default=DEFAULT_TILE_SIZE, help="瓦片边长 (度)")
+    args = ap.parse_args()
+    out = args.out or args.source + ".tiles"
+    manifest = build(args.source, out, args.size)
+    print(f"{len(manifest['tiles'])} tiles written to {out}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+"""
+多点漫游的访问顺序求解 (带固定起点的 TSP / 哈密顿路径)
+dist 为 (n+1)x(n+1) 路网距离矩阵, 0 号为起点, 1..n 为途经点, -1 表示不可达
+路网为无向图, 矩阵视为对称
+"""
+from itertools import combinations
+from time import perf_counter
+
+EXACT_LIMIT = 10        # 途经点不超过该数量时用 Held-Karp 精确求解
+IMPROVE_EPS = 1e-9      # 局部搜索的相对改进阈值, 小于它的改进视为舍入误差
+
+
+def _weights(dist):
+    """
+    不可达腿 (-1) 的惩罚取 "比任何一条全由可达腿组成的路线都长" 的最小量级: 腿数 x 最长可达腿 + 1,
+    不可达腿少的顺序总是更优, 代价又与真实距离同量级, 比较时不会被舍入误差淹没
+    """
+    longest = max((d for row in dist for d in row if d != -1), default=0.0)
+    penalty = len(dist) * longest + 1.0
+    return [[penalty if d == -1 else d for d in row] for row in dist]
+
+
+def held_karp(D, return_to_start=False, end=None):
+    """ 状态压缩 DP, O(2^n * n^2); 返回 (途经点顺序, 代价) """
+    n = len(D) - 1
+    if n == 0: return [], 0.0
+    full = (1 << n) - 1
+    # dp[(mask, j)]: 从起点出发, 恰好经过 mask 中的途经点并停在 j (1-based) 的最短代价
+    dp, parent = {}, {}
+    for j in range(1, n + 1):
+        dp[(1 << (j - 1), j)] = D[0][j]
+    for size in range(2, n + 1):
+        for subset in combinations(range(1, n + 1), size):
+            mask = 0
+            for j in subset: mask |= 1 << (j - 1)
+            for j in subset:
+                prev_mask = mask ^ (1 << (j - 1))
+                best, best_k = None, None
+                for k in subset:
+                    if k == j: continue
+                    c = dp[(prev_mask, k)] + D[k][j]
+                    if best is None or c < best: best, best_k = c, k
+                dp[(mask, j)], parent[(mask, j)] = best, best_k
+
+    if end is not None:
+        last, cost = end, dp[(full, end)]
+    else:
+        close = (lambda j: D[j][0]) if return_to_start else (lambda j: 0.0)
+        last = min(range(1, n + 1), key=lambda j: dp[(full, j)] + close(j))
+        cost = dp[(full, last)] + close(last)
+
+    order, mask, j = [], full, last
+    while j is not None:
+        order.append(j)
+        mask, j = mask ^ (1 << (j - 1)), parent.get((mask, j))
+    order.reverse()
+    return order, cost
+
+
+def local_search(D, return_to_start=False, end=None, time_budget=0.2):
+    """
+    最近邻构造 + 2-opt / Or-opt 局部搜索, 超出 time_budget (秒) 即返回当前最优
+    路径写成 [0] + 内部点 + [尾], 尾为: 回到起点时的 0 / 固定终点 end / 开放终点时的虚拟点 Z (到任意点距离为 0)
+    """
+    deadline = perf_counter() + time_budget
+    n = len(D) - 1
+    Z = n + 1
+    if end is None and not return_to_start:
+        D = [row + [0.0] for row in D] + [[0.0] * (n + 2)]
+        tail = Z
+    else:
+        tail = 0 if end is None else end
+    interior = [j for j in range(1, n + 1) if j != end]
+
+    # 最近邻构造初始解
+    path, cur, left = [0], 0, set(interior)
+    while left:
+        cur = min(left, key=lambda j: D[cur][j])
+        left.remove(cur); path.append(cur)
+    path.append(tail)
+
+    improved = True
+    while improved and perf_counter() < deadline:
+        improved = False
+        m = len(path)
+        # 2-opt: 反转 path[i..k]
+        for i in range(1, m - 2):
+            for k in range(i + 1, m - 1):
+                a, b, c, e = path[i - 1], path[i], path[k], path[k + 1]
+                if D[a][c] + D[b][e] < (D[a][b] + D[c][e]) * (1 - IMPROVE_EPS):
+                    path[i:k + 1] = reversed(path[i:k + 1])
+                    improved = True
+            if perf_counter() >= deadline: break
+        # Or-opt: 把长度 1~3 的片段 (可反向) 挪到别处
+        for seg in (1, 2, 3):
+            i = 1
+            while i + seg <= m - 1:
+                a, first, last, b = path[i - 1], path[i], path[i + seg - 1], path[i + seg]
+                gain = D[a][first] + D[last][b] - D[a][b]
+                rest = path[:i] + path[i + seg:]
+                best = None
+                for p in range(len(rest) - 1):
+                    if p == i - 1: continue
+                    x, y = rest[p], rest[p + 1]
+                    for f, l, rev in ((first, last, False), (last, first, True)):
+                        added, removed = D[x][f] + D[l][y], D[x][y] + gain
+                        delta = added - removed
+                        if added < removed * (1 - IMPROVE_EPS) and (best is None or delta < best[0]):
+                            best = (delta, p, rev)
+                if best is not None:
+                    _, p, rev = best
+                    moved = path[i:i + seg]
+                    if rev: moved.reverse()
+                    path = rest[:p + 1] + moved + rest[p + 1:]
+                    improved = True
+                i += 1
+            if perf_counter() >= deadline: break
+
+    order = path[1:-1] + ([end] if end is not None else [])
+    return order, path_cost(D, path)
+
+
+def path_cost(D, path):
+    return sum(D[a][b] for a, b in zip(path, path[1:]))
+
+
+def solve(dist, return_to_start=False, end=None, time_budget=0.2, exact_limit=EXACT_LIMIT):
+    """
+    返回 (途经点顺序 (1-based), 代价, 方法 "exact"/"heuristic", 耗时秒)
+    end: 固定最后一个途经点 (1-based), 与 return_to_start 互斥
+    """
+    start = perf_counter()
+    D = _weights(dist)
+    if len(D) - 1 <= exact_limit:
+        order, cost = held_karp(D, return_to_start, end)
+        method = "exact"
+    else:
+        order, cost = local_search(D, return_to_start, end, time_budget)
+        method = "heuristic"
+    return order, cost, method, perf_counter() - start
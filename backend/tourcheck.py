@@ -0,0 +1,139 @@
+"""
+多点漫游求解检查: Held-Karp 必须与穷举给出相同的最优代价, 局部搜索给出合法顺序并统计与最优解的差距
+    python backend/tourcheck.py                  # 真实路网距离矩阵 (随机建筑) + 含不可达腿的随机矩阵
+    python backend/tourcheck.py --max-n 9 --rounds 50
+三种模式: 开放终点、回到起点、固定最后一个途经点; 精确解不一致或顺序非法时以非零状态码退出
+另外检查含不可达途经点的大实例: 局部搜索须收敛, 远在时间预算之前返回
+"""
+import random
+import time
+from itertools import permutations
+
+from settings import finish, open_parser, script_arguments
+import tour
+
+EPS = 1e-6
+MODES = ("open", "return", "end")
+BUDGET = 0.2            # 局部搜索时间预算 (秒), 与 /api/find_tour 的默认值相同
+CONVERGE_LIMIT = 0.25   # 含不可达途经点时, 耗时须低于预算的这一比例
+
+
+def route_of(order, mode):
+    return [0] + list(order) + ([0] if mode == "return" else [])
+
+
+def brute_force(D, mode, end):
+    """ 返回 (最优代价, 最优顺序) """
+    n = len(D) - 1
+    best = (None, None)
+    for order in permutations(range(1, n + 1)):
+        if mode == "end" and order[-1] != end: continue
+        cost = tour.path_cost(D, route_of(order, mode))
+        if best[0] is None or cost < best[0]: best = (cost, order)
+    return best
+
+
+def legs(dist, order, mode):
+    """ (不可达腿数, 可达腿的总距离): 含不可达腿时按它比较, 惩罚值本身不是距离 """
+    path = route_of(order, mode)
+    pairs = [dist[a][b] for a, b in zip(path, path[1:])]
+    return sum(1 for d in pairs if d == -1), sum(d for d in pairs if d != -1)
+
+
+def valid(order, n, mode, end):
+    return sorted(order) == list(range(1, n + 1)) and (mode != "end" or order[-1] == end)
+
+
+def road_matrix(parser, n, rng):
+    """ 随机取 n + 1 个建筑, 用路网距离矩阵 (与 /api/find_tour 相同) """
+    locs = [(nd.lat, nd.lon) for _, (_, nd), _ in parser.building_info_list if nd is not None]
+    points = rng.sample(locs, n + 1)
+    return parser.distance_matrix(points, points, rng.choice((1, 2)))
+
+
+def random_matrix(n, rng):
+    """ 对称随机矩阵, 约一成的腿不可达 (-1) """
+    dist = [[0.0] * (n + 1) for _ in range(n + 1)]
+    for i in range(n + 1):
+        for j in range(i + 1, n + 1):
+            dist[i][j] = dist[j][i] = -1 if rng.random() < 0.1 else rng.uniform(10, 2000)
+    return dist
+
+
+def unreachable_matrix(parser, n, rng):
+    """ 步行路网上 n 个途经点, 其中若干取自与起点不连通的分量; 路网全连通时返回 None """
+    graph = parser.graphs[1]
+    start = rng.randrange(len(graph))
+    reach, _ = graph.single_source(start)
+    apart = [i for i in range(len(graph)) if i not in reach]
+    if not apart: return None
+    inside = list(reach)
+    stops = [rng.choice(inside) for _ in range(n - 3)] + [rng.choice(apart) for _ in range(3)]
+    rng.shuffle(stops)
+    points = [graph.coord(i) for i in [start] + stops]
+    return parser.distance_matrix(points, points, 1)
+
+
+def check_convergence(parser, rng, rounds):
+    """ 超出精确求解规模且含不可达腿的实例, 返回失败数 """
+    bad = 0
+    n = tour.EXACT_LIMIT + 5
+    for k in range(2 * rounds):
+        dist = unreachable_matrix(parser, n, rng) if k < rounds else None
+        if dist is None: dist = random_matrix(n, rng)
+        for mode in MODES:
+            end = rng.randrange(1, n + 1) if mode == "end" else None
+            order, cost, method, elapsed = tour.solve(dist, mode == "return", end, BUDGET)
+            if method != "heuristic" or not valid(order, n, mode, end) or elapsed > BUDGET * CONVERGE_LIMIT:
+                bad += 1
+                print(f"  n={n} {mode} unreachable: method={method} elapsed={elapsed * 1000:.1f}ms")
+    return bad
+
+
+def main():
+    ap = script_arguments(__doc__)
+    ap.add_argument("--max-n", type=int, default=8, help="途经点数上限 (穷举为 n!)")
+    ap.add_argument("--rounds", type=int, default=20, help="每个途经点数与模式的实例数")
+    args = ap.parse_args()
+
+    parser = open_parser(cache_size=0)
+    rng = random.Random(args.seed)
+
+    # 分别统计: 路网距离满足三角不等式, 随机矩阵不满足, 局部搜索在后者上的差距会大得多
+    bad, gaps, extra = 0, {"road": [], "random": []}, 0
+    for n in range(1, args.max_n + 1):
+        for mode in MODES:
+            for k in range(args.rounds):
+                kind = "road" if k % 2 == 0 else "random"
+                dist = road_matrix(parser, n, rng) if kind == "road" else random_matrix(n, rng)
+                D = tour._weights(dist)
+                end = rng.randrange(1, n + 1) if mode == "end" else None
+                optimum, best = brute_force(D, mode, end)
+                for name, solver in (("held_karp", tour.held_karp), ("local_search", tour.local_search)):
+                    order, cost = solver(D, mode == "return", end)
+                    actual = tour.path_cost(D, route_of(order, mode))
+                    ok = valid(order, n, mode, end) and abs(actual - cost) <= EPS * max(1.0, actual)
+                    if name == "held_karp": ok = ok and abs(cost - optimum) <= EPS * max(1.0, optimum)
+                    else: ok = ok and cost >= optimum - EPS * max(1.0, optimum)
+                    if not ok:
+                        bad += 1
+                        print(f"  n={n} {mode} {name}: order={order} cost={cost} optimum={optimum}")
+                    elif name == "local_search":
+                        (lost, length), (need, shortest) = legs(dist, order, mode), legs(dist, best, mode)
+                        if lost > need: extra += 1
+                        else: gaps[kind].append(length / shortest - 1 if shortest > 0 else 0.0)
+
+    bad += check_convergence(parser, rng, args.rounds)
+
+    total = args.max_n * len(MODES) * args.rounds
+    print(f"instances={total} max_n={args.max_n}")
+    for kind, values in gaps.items():
+        if not values: continue
+        print(f"local_search gap ({kind:<6}) mean {sum(values) / len(values) * 100:.2f}%  max {max(values) * 100:.2f}%  "
+              f"optimal {sum(1 for g in values if g <= EPS) / len(values) * 100:.1f}%")
+    print(f"local_search with more unreachable legs than the optimum: {extra}")
+    finish(bad)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+分时段路况模型
+配置文件 (traffic.json) 定义上课时间表、若干时段以及教学楼周边的拥堵区域:
+    slots : {时段名: {"before_class_min": 上课前多少分钟, "windows": [["HH:MM", "HH:MM"], ...],
+                      "multiplier": {"walk": 全图默认倍率, "bike": ...}}}
+    zones : [{"buildings": [建筑名], "radius": 米, "multiplier": {时段名: {"walk": 倍率, "bike": 倍率}}}]
+时间表在加载时编译成按分钟索引的时段表; 每个时段的边权数组在加载路网后一次性算好,
+查询时只需按 time= 选出对应时段的图
+"""
+import json
+from array import array
+
+MODES = {"walk": 1, "bike": 2}
+NORMAL = 0 # 0 号时段为平峰, 使用原始边权
+
+
+def parse_minute(time_str):
+    """ "HH:MM" -> 当天第几分钟; 格式不合法时抛出 ValueError """
+    h, m = time_str.split(":")
+    h, m = int(h), int(m)
+    if not (0 <= h < 24 and 0 <= m < 60): raise ValueError(time_str)
+    return h * 60 + m
+
+
+class TrafficModel():
+    def __init__(self, config):
+        self.class_start_times = config.get("class_start_times", [])
+        self.slot_names = ["normal"] + list(config.get("slots", {}))
+        self.slot_multiplier = [{1: 1.0, 2: 1.0}]
+        self.minute_slot = bytearray(24 * 60)
+        classes = [parse_minute(t) for t in self.class_start_times]
+
+        for s, name in enumerate(self.slot_names[1:], start=1):
+            slot = config["slots"][name]
+            self.slot_multiplier.append(self._modes(slot.get("multiplier", {})))
+            before = slot.get("before_class_min")
+            if before:
+                # [上课前 N 分钟, 上课时间)
+                for c in classes:
+                    for m in range(c - before, c):
+                        self.minute_slot[m % 1440] = s
+            for start, end in slot.get("windows", []):
+                for m in range(parse_minute(start), parse_minute(end)):
+                    self.minute_slot[m] = s
+
+        self.zones = []
+        for zone in config.get("zones", []):
+            per_slot = {self.slot_names.index(name): self._modes(mult)
+                        for name, mult in zone.get("multiplier", {}).items()}
+            self.zones.append((zone.get("buildings", []), float(zone.get("radius", 50)), per_slot))
+
+    @staticmethod
+    def _modes(mult):
+        out = {1: float(mult.get("walk", 1.0)), 2: float(mult.get("bike", 1.0))}
+        # 倍率不小于 1 时原始边长仍是下界, A*/ALT 启发函数保持可采纳
+        if min(out.values()) < 1.0: raise ValueError(f"traffic multiplier must be >= 1: {mult}")
+        return out
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def slot_of(self, time_str):
+        """ 出发时间 -> 时段下标, 无法解析时视为平峰 """
+        try:
+            return self.minute_slot[parse_minute(time_str)]
+        except (ValueError, AttributeError):
+            return NORMAL
+
+    def multiplier(self, slot, type):
+        """ 时段在全图的默认倍率 (type 1 = 步行, 2 = 骑行) """
+        return self.slot_multiplier[slot][type]
+
+    def build_weights(self, parser):
+        """
+        为每种出行方式、每个非平峰时段生成一份边权数组
+        边的倍率取 max(时段默认倍率, 两端点所在拥堵区域的倍率); 返回 {(type, slot): weights}
+        倍率全为 1 的组合直接复用原始边权
+        """
+        out = {}
+        for type, graph in parser.graphs.items():
+            for slot in range(1, len(self.slot_names)):
+                node_mult = {}
+                for buildings, radius, per_slot in self.zones:
+                    m = per_slot.get(slot, {}).get(type, 1.0)
+                    if m <= 1.0: continue
+                    for v in self._zone_nodes(parser, type, buildings, radius):
+                        if m > node_mult.get(v, 1.0): node_mult[v] = m
+                base = self.multiplier(slot, type)
+                if base == 1.0 and not node_mult: continue
+
+                weights = array('d', graph.weights)
+                targets, offsets = graph.targets, graph.offsets
+                for u in range(len(graph)):
+                    mu = node_mult.get(u, 1.0)
+                    for k in range(offsets[u], offsets[u + 1]):
+                        weights[k] *= max(base, mu, node_mult.get(targets[k], 1.0))
+                out[(type, slot)] = weights
+        return out
+
+    @staticmethod
+    def zone_points(parser, buildings):
+        """ 拥堵区域的中心点: 建筑轮廓顶点, 无轮廓时取接入点 """
+        info = {name: (walk, bike) for name, walk, bike in parser.building_info_list}
+        points = []
+        for name in buildings:
+            polygon = parser.building_polygons.get(name) or []
+            if not polygon and name in info:
+                polygon = [(n.lat, n.lon) for _, n in info[name] if n is not None]
+            points.extend(polygon)
+        return points
+
+    @classmethod
+    def _zone_nodes(cls, parser, type, buildings, radius):
+        """ 距区域中心点 radius 以内的路网节点 """
+        index = parser.spatial[type]
+        nodes = set()
+        for lat, lon in cls.zone_points(parser, buildings):
+            nodes.update(index.within(lat, lon, radius))
+        return nodes
@@ -0,0 +1,139 @@
+"""
+在线更新一致性检查: 随机封路 / 调整权重 / 重新开放, 每一步之后
+- 距离表: 真实发生变化的行必须都被 affected_rows 标记过期, 后台重算后与在新边权上重建的表一致
+- 路径缓存: 缓存与查表给出的最短路代价与在新边权上重新搜索的结果一致
+- 距离矩阵: 各时段的实际距离与代价与逐对调用 Timed_path_pos 一致 (reweight 只计入代价)
+    python backend/updatecheck.py
+    python backend/updatecheck.py --steps 100
+规则只作用于内存中的路网, 不读写 closures.json; 发现不一致时以非零状态码退出
+"""
+import random
+import sys
+import time
+from array import array
+
+from distance_table import DistanceTable
+from settings import finish, open_parser, script_arguments
+from traffic import NORMAL
+from updates import GraphUpdater
+
+EPS = 1e-6
+
+
+def differs(a, b):
+    return (a == float("inf")) != (b == float("inf")) or (a != float("inf") and abs(a - b) > EPS * max(1.0, b))
+
+
+def changed_rows(table, old, new):
+    k = len(table.nodes)
+    return {r for r in range(k) if any(differs(old[i], new[i]) for i in range(r * k, (r + 1) * k))}
+
+
+def check_matrix(parser, points, step):
+    """ distance_matrix 的 (实际距离, 代价) 与逐对 Timed_path_pos 比较, 返回失败数 """
+    bad = 0
+    slots = {NORMAL} | {slot for _, slot in parser.slot_graphs}
+    for tp in parser.graphs:
+        for slot in sorted(slots):
+            lengths, costs = parser.distance_matrix(points, points, tp, slot, with_lengths=True)
+            for i, a in enumerate(points):
+                for j, b in enumerate(points):
+                    _, dist, cost = parser.Timed_path_pos(a, b, tp, slot)
+                    if differs(lengths[i][j], dist) or differs(costs[i][j], cost):
+                        bad += 1
+                        print(f"  step {step} type{tp} slot {slot} matrix {i}->{j}: "
+                              f"({lengths[i][j]}, {costs[i][j]}) != ({dist}, {cost})")
+    return bad
+
+
+def random_rule(parser, ways, rng, step):
+    """ 随机生成一条 close (way / node) 或 reweight (nodes) 规则 """
+    graph = parser.graphs[1]
+    kind = rng.choice(("way", "node", "reweight"))
+    if kind == "way":
+        return {"id": f"s{step}", "action": "close", "way": rng.choice(ways)}
+    u = rng.randrange(len(graph))
+    if kind == "node": return {"id": f"s{step}", "action": "close", "node": graph.ids[u]}
+    nodes = [u]
+    for _ in range(rng.randint(1, 6)):
+        nbrs = [v for v, _ in graph.neighbours(nodes[-1]) if v not in nodes]
+        if not nbrs: break
+        nodes.append(rng.choice(nbrs))
+    if len(nodes) < 2: return {"id": f"s{step}", "action": "close", "node": graph.ids[u]}
+    return {"id": f"s{step}", "action": "reweight", "factor": rng.choice((1.5, 2.0, 4.0)),
+            "nodes": [graph.ids[v] for v in nodes]}
+
+
+def main():
+    ap = script_arguments(__doc__)
+    ap.add_argument("--steps", type=int, default=40)
+    ap.add_argument("--queries", type=int, default=200, help="每一步检查的路径查询数")
+    ap.add_argument("--points", type=int, default=8, help="每一步检查的距离矩阵边长")
+    args = ap.parse_args()
+
+    parser = open_parser(traffic=True)
+    updater = GraphUpdater(parser)
+    rng = random.Random(args.seed)
+    ways = sorted(parser.highway_refs())
+
+    # 记录每一步被标记过期的行
+    marked = {tp: set() for tp in parser.tables}
+    for tp, table in parser.tables.items():
+        def invalidate(rows, table=table, tp=tp, original=table.invalidate):
+            marked[tp].update(rows)
+            original(rows)
+        table.invalidate = invalidate
+
+    # 每一步重复同一批查询, 上一步缓存的路线在更新后被复用或淘汰
+    queries = {}
+    for tp, graph in parser.graphs.items():
+        nodes = list(parser.tables[tp].nodes) if tp in parser.tables else range(len(graph))
+        # 一半在建筑接入点之间 (查表), 一半为任意节点 (搜索 + 缓存)
+        queries[tp] = [(rng.choice(nodes), rng.choice(nodes)) if k % 2 == 0 else
+                       (rng.randrange(len(graph)), rng.randrange(len(graph))) for k in range(args.queries)]
+
+    locs = [(nd.lat, nd.lon) for _, (_, nd), _ in parser.building_info_list if nd is not None]
+    points = rng.sample(locs, min(args.points, len(locs)))
+
+    bad, stale_total, truth_total = 0, 0, 0
+    rules = []
+    for step in range(args.steps):
+        if rules and rng.random() < 0.3: rules.pop(rng.randrange(len(rules)))
+        else: rules.append(random_rule(parser, ways, rng, step))
+        before = {tp: array('d', t.dist) for tp, t in parser.tables.items()}
+        for rows in marked.values(): rows.clear()
+        try:
+            updater.set_rules(rules)
+        except ValueError:
+            rules.pop()
+            continue
+        while updater.refreshing: time.sleep(0.01)
+
+        for tp, table in parser.tables.items():
+            graph = parser.graphs[tp]
+            ref = DistanceTable.build(graph, table.nodes)
+            truth = changed_rows(table, before[tp], ref.dist)
+            missed = truth - marked[tp]
+            wrong = changed_rows(table, table.dist, ref.dist)
+            stale_total += len(marked[tp]); truth_total += len(truth)
+            if missed or wrong:
+                bad += 1
+                print(f"  step {step} type{tp}: missed rows {sorted(missed)[:10]} wrong after refresh {sorted(wrong)[:10]}")
+
+        for tp, graph in parser.graphs.items():
+            for src, dst in queries[tp]:
+                _, cost = parser.Shortest_path_node((graph.ids[src], None), (graph.ids[dst], None), tp)
+                _, ref = graph.route(src, dst, "dijkstra")
+                if (cost == sys.maxsize) != (ref == sys.maxsize) or \
+                        (ref != sys.maxsize and abs(cost - ref) > EPS * max(1.0, ref)):
+                    bad += 1
+                    print(f"  step {step} type{tp} route {src}->{dst}: {cost} != {ref}")
+        bad += check_matrix(parser, points, step)
+
+    print(f"steps={args.steps} rules={len(rules)} route_cache={parser.route_cache.stats()}")
+    print(f"table rows marked {stale_total}, actually changed {truth_total}")
+    finish(bad)
+
+
+if __name__ == "__main__":
+    main()
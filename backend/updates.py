@@ -0,0 +1,288 @@
+"""
+路网在线更新: 封路 / 重新开放 / 调整权重, 不重新解析地图
+规则文件 (closures.json) 与管理接口使用同一格式:
+    {"rules": [{"id": "图书馆施工", "action": "close", "way": 123456},
+               {"id": "东门活动", "action": "close", "node": 654321},
+               {"id": "南区坡道", "action": "reweight", "factor": 1.5, "nodes": [1, 2, 3]}]}
+    way    : OSM way id, 作用于该道路相邻节点之间的所有边
+    node   : OSM node id, 作用于该节点的所有边 (封闭后也不再作为吸附点)
+    nodes  : 节点 id 序列, 作用于序列中相邻节点之间的边
+    factor : reweight 的倍率, 须不小于 1 (A*/ALT 启发函数保持可采纳); close 视为倍率无穷大
+重新开放即删除对应 id 的规则. 边的实际权重 = 原始权重 x 覆盖它的规则中最大的倍率,
+两种出行方式的图及其分时段边权都在原数组上修改, 原始边长另存 (路线距离仍按原始长度计, 只有代价/耗时含倍率);
+只重算受影响建筑的接入点、失效经过变化边的缓存、重算受影响的距离表行
+"""
+from array import array
+from bisect import bisect_right
+import json
+import os
+import threading
+from time import perf_counter
+
+INF = float("inf")
+ACTIONS = ("close", "reweight")
+
+
+def normalize_rule(rule):
+    """ 校验一条规则并返回规范形式; 格式错误时抛出 ValueError """
+    if not isinstance(rule, dict): raise ValueError(f"rule must be an object: {rule!r}")
+    rid = str(rule.get("id", "")).strip()
+    if not rid: raise ValueError("rule id is required")
+    action = rule.get("action", "close")
+    if action not in ACTIONS: raise ValueError(f"unknown action {action!r} in rule {rid}")
+    out = {"id": rid, "action": action}
+    if action == "reweight":
+        factor = float(rule.get("factor", 1.0))
+        if not factor >= 1.0: raise ValueError(f"factor must be >= 1 in rule {rid}")
+        out["factor"] = factor
+    targets = [k for k in ("way", "node", "nodes") if k in rule]
+    if len(targets) != 1: raise ValueError(f"rule {rid} needs exactly one of way/node/nodes")
+    key = targets[0]
+    out[key] = [int(x) for x in rule[key]] if key == "nodes" else int(rule[key])
+    if key == "nodes" and len(out[key]) < 2: raise ValueError(f"rule {rid} needs at least two nodes")
+    return out
+
+
+class GraphUpdater():
+    def __init__(self, parser, path=None):
+        self.parser = parser
+        self.path = path
+        self.rules = {}      # id -> 规范化规则
+        self.edge_rules = {} # (出行方式, 边下标) -> {规则 id: 倍率}
+        self.base = {}       # (出行方式, 时段) -> 原始边权拷贝, 首次修改时生成
+        self.origin = None   # 首次更新前的建筑接入点, POI 无轮廓时以此定位
+        self.mtime = None
+        self.lock = threading.RLock()
+        self.refreshing = False
+
+    # --- 规则 -> 边 ---
+
+    def _edges(self, rule):
+        """ 返回 {出行方式: {边下标}} (双向边都包含); 引用不存在的 way/节点时抛出 ValueError """
+        parser = self.parser
+        if "way" in rule:
+            refs = parser.highway_refs().get(rule["way"])
+            if refs is None: raise ValueError(f"unknown way {rule['way']} in rule {rule['id']}")
+            pairs, nodes = list(zip(refs, refs[1:])), []
+        elif "nodes" in rule:
+            pairs, nodes = list(zip(rule["nodes"], rule["nodes"][1:])), []
+        else:
+            pairs, nodes = [], [rule["node"]]
+
+        out, found = {}, False
+        for tp, graph in parser.graphs.items():
+            offsets, targets, index = graph.offsets, graph.targets, graph.index
+            edges = set()
+            for a, b in pairs:
+                ia, ib = index.get(a), index.get(b)
+                if ia is None or ib is None: continue
+                for u, v in ((ia, ib), (ib, ia)):
+                    edges.update(k for k in range(offsets[u], offsets[u + 1]) if targets[k] == v)
+            for nid in nodes:
+                u = index.get(nid)
+                if u is None: continue
+                found = True
+                for k in range(offsets[u], offsets[u + 1]):
+                    v = targets[k]
+                    edges.add(k)
+                    edges.update(j for j in range(offsets[v], offsets[v + 1]) if targets[j] == u)
+            found = found or bool(edges)
+            out[tp] = edges
+        if not found: raise ValueError(f"rule {rule['id']} does not match any road")
+        return out
+
+    def _graphs(self, tp):
+        """ 出行方式 tp 的原始图与各时段加权图 (共享拓扑, 边下标一致) """
+        yield None, self.parser.graphs[tp]
+        for (t, slot), graph in self.parser.slot_graphs.items():
+            if t == tp: yield slot, graph
+
+    # --- 更新 ---
+
+    def set_rules(self, rules):
+        """ 以 rules 整体替换当前规则, 只处理新增/删除/变化的部分; 返回本次更新的统计 """
+        start = perf_counter()
+        new = {}
+        for r in rules:
+            r = normalize_rule(r)
+            new[r["id"]] = r
+        with self.lock:
+            removed = [rid for rid, r in self.rules.items() if new.get(rid) != r]
+            added = [rid for rid, r in new.items() if self.rules.get(rid) != r]
+            added_edges = {rid: self._edges(new[rid]) for rid in added} # 先全部校验, 出错时不做任何修改
+            if self.origin is None and (removed or added):
+                self.origin = {name: (walk, bike) for name, walk, bike in self.parser.building_info_list}
+
+            touched = set()
+            for rid in removed:
+                for tp, edges in self._edges(self.rules[rid]).items():
+                    for k in edges:
+                        self.edge_rules.get((tp, k), {}).pop(rid, None)
+                        touched.add((tp, k))
+            for rid in added:
+                factor = INF if new[rid]["action"] == "close" else new[rid]["factor"]
+                for tp, edges in added_edges[rid].items():
+                    for k in edges:
+                        self.edge_rules.setdefault((tp, k), {})[rid] = factor
+                        touched.add((tp, k))
+            self.rules = new
+            summary = self._apply(touched)
+        summary["rules"] = len(self.rules)
+        summary["elapsed_ms"] = (perf_counter() - start) * 1000
+        return summary
+
+    def _apply(self, touched):
+        parser = self.parser
+        changes = []
+        increased = {tp: set() for tp in parser.graphs}
+        decreased = {tp: {} for tp in parser.graphs}
+        for tp, k in touched:
+            rules = self.edge_rules.get((tp, k))
+            if not rules: self.edge_rules.pop((tp, k), None)
+            factor = max(rules.values()) if rules else 1.0
+            graph = parser.graphs[tp]
+            old, new = graph.weights[k], self._base(tp, None, graph)[k] * factor
+            if old == new: continue
+            edge = (self._source(graph, k), graph.targets[k])
+            if new > old: increased[tp].add(edge)
+            else: decreased[tp][edge] = new
+            changes.append((tp, k, factor))
+
+        # 先让受影响的距离表行失效, 再改边权, 并发查询不会查到过期的表
+        rows = {}
+        for tp, table in parser.tables.items():
+            if increased[tp] or decreased[tp]:
+                affected = table.affected_rows(parser.graphs[tp], increased[tp], decreased[tp])
+                table.invalidate(affected)
+                rows[tp] = len(affected)
+        for tp, k, factor in changes:
+            for slot, g in self._graphs(tp):
+                g.weights[k] = self._base(tp, slot, g)[k] * factor
+
+        buildings = self._refresh_access(increased, decreased)
+        evicted = sum(self._evict_routes(tp, increased[tp], decreased[tp])
+                      for tp in parser.graphs if increased[tp] or decreased[tp])
+        if rows: self._start_table_refresh()
+        return {"edges": len(changes), "buildings": buildings, "routes_evicted": evicted, "table_rows": rows}
+
+    def _start_table_refresh(self):
+        """ 过期的距离表行在后台线程中重算, 期间相关查询改走图搜索 """
+        with self.lock:
+            if self.refreshing: return
+            self.refreshing = True
+        def run():
+            while True:
+                for tp, table in self.parser.tables.items():
+                    table.refresh(self.parser.graphs[tp])
+                with self.lock:
+                    if not any(t.stale for t in self.parser.tables.values()):
+                        self.refreshing = False
+                        return
+        threading.Thread(target=run, daemon=True).start()
+
+    def _base(self, tp, slot, graph):
+        if (tp, slot) not in self.base:
+            self.base[(tp, slot)] = array('d', graph.weights)
+            if slot is None:
+                for _, g in self._graphs(tp): g.lengths = self.base[(tp, None)]
+        return self.base[(tp, slot)]
+
+    @staticmethod
+    def _source(graph, k):
+        """ 边下标 -> 起点下标 (offsets 有序, 二分查找) """
+        return bisect_right(graph.offsets, k) - 1
+
+    def _refresh_access(self, increased, decreased):
+        """
+        更新封闭节点集合 (出边全部封闭的节点), 只重算受影响建筑的接入点:
+        接入点被封闭的建筑, 以及离重新开放的节点不比离当前接入点远的建筑 (与加载时的取法一致); 返回重算的建筑名
+        """
+        parser = self.parser
+        closed, opened = {}, {}
+        for tp, graph in parser.graphs.items():
+            blocked = parser.blocked[tp]
+            closed[tp], opened[tp] = set(), set()
+            for u in {u for edge in increased[tp] | decreased[tp].keys() for u in edge}:
+                lo, hi = graph.offsets[u], graph.offsets[u + 1]
+                shut = hi > lo and all(graph.weights[k] == INF for k in range(lo, hi))
+                if shut and u not in blocked:
+                    blocked.add(u); closed[tp].add(graph.ids[u])
+                elif not shut and u in blocked:
+                    blocked.discard(u); opened[tp].add(u)
+        if not any(closed.values()) and not any(opened.values()): return []
+
+        # 接入点位置 1 = 步行, 2 = 骑行 (无骑行路网时与加载时一致, 用步行图)
+        types = {1: 1, 2: 2 if len(parser.graphs[2]) else 1}
+        names = []
+        for pos, (name, *access) in enumerate(parser.building_info_list):
+            points = self._points(name)
+            stale = False
+            for j, tp in types.items():
+                nid, nd = access[j - 1]
+                if nid in closed[tp]: stale = True
+                elif opened[tp] and nd is not None:
+                    graph = parser.graphs[tp]
+                    current = min(parser.calculate_distance(nd.lat, nd.lon, lat, lon) for lat, lon in points)
+                    stale = any(parser.calculate_distance(graph.lat[u], graph.lon[u], lat, lon) <= current
+                                for u in opened[tp] for lat, lon in points)
+                if stale: break
+            if not stale: continue
+            new = []
+            for tp in types.values():
+                best = min((parser.nearest_node(tp, lat, lon) for lat, lon in points), key=lambda r: r[2])
+                new.append((best[0], best[1]))
+            parser.building_info_list[pos] = (name, new[0], new[1])
+            names.append(name)
+        return names
+
+    def _points(self, name):
+        """ 建筑轮廓顶点; POI 没有轮廓, 以首次更新前的接入点位置代替 """
+        polygon = self.parser.building_polygons.get(name)
+        if polygon: return [tuple(p) for p in polygon]
+        walk, bike = self.origin[name]
+        return [(n.lat, n.lon) for _, n in (walk, bike) if n is not None][:1]
+
+    def _evict_routes(self, tp, increased, decreased):
+        """ 变大的边只让经过它的缓存路线失效; 有边变小时该出行方式的缓存全部失效 (任何路线都可能变短) """
+        mode = lambda key: key[0] if isinstance(key, tuple) else key
+        if decreased:
+            return self.parser.route_cache.discard(lambda key, route: mode(key) == tp)
+        ids = self.parser.graphs[tp].ids
+        pairs = {(ids[u], ids[v]) for u, v in increased}
+        return self.parser.route_cache.discard(
+            lambda key, route: mode(key) == tp and any(p in pairs for p in zip(route, route[1:])))
+
+    # --- 规则文件 ---
+
+    def read(self):
+        with open(self.path, encoding="utf-8") as f:
+            return json.load(f).get("rules", [])
+
+    def save(self):
+        """ 原子写回规则文件, 其它进程通过 sync 感知 """
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"rules": list(self.rules.values())}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+        self.mtime = os.stat(self.path).st_mtime_ns
+
+    def sync(self):
+        """ 规则文件出现或被其它进程修改时重新应用; 无变化返回 None """
+        if self.path is None: return None
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self.mtime: return None
+        self.mtime = mtime
+        return self.set_rules(self.read() if mtime is not None else [])
+
+    def update(self, rules=(), reopen=()):
+        """ 新增或替换 (按 id) rules, 删除 reopen 中的规则, 写回规则文件 """
+        current = {rid: r for rid, r in self.rules.items() if rid not in set(reopen)}
+        for r in rules:
+            r = normalize_rule(r)
+            current[r["id"]] = r
+        summary = self.set_rules(list(current.values()))
+        if self.path is not None: self.save()
+        return summary
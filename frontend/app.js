@@ -24,9 +24,16 @@ $(document).ready(function() {
     const selConf = { width: '100%', placeholder: "搜索地点...", allowClear: true };
     $('.poi-select').select2(selConf);
 
-    // 加载数据
-    fetch(`${API}/api/locations`)
-        .then(r=>r.json()).then(pois => {
+    // 加载数据; 后端地图仍在加载时 (503) 按 Retry-After 稍后重试
+    function loadLocations() {
+        fetch(`${API}/api/locations`).then(r => {
+            if(r.status === 503) {
+                setTimeout(loadLocations, (parseFloat(r.headers.get('Retry-After')) || 2) * 1000);
+                return null;
+            }
+            return r.json();
+        }).then(pois => {
+            if(!pois) return;
             data.all = pois;
             const opts = pois.map(p => new Option(p.name, p.name, false, false));
             $('#sel-start').append([...opts.map(o=>o.cloneNode(true))]);
@@ -36,6 +43,8 @@ $(document).ready(function() {
             
             pois.forEach(p => createClickArea(p));
         });
+    }
+    loadLocations();
 
     function createClickArea(p) {
         let l;